@@ -0,0 +1,188 @@
+"""
+Credential manager - one parsed OAuth Credentials object per session.
+
+Handlers used to parse session["creds"] on every request, and refreshed
+access tokens were never written back, so each new service object could
+pay for its own refresh. A CredentialManager keeps the parsed Credentials,
+refreshes it in the background shortly before it expires (single-flight),
+and writes the refreshed token back to the session store.
+
+Background refreshes for all sessions share one scheduler thread, driven by
+a heap of due times. Sessions idle for IDLE_TIMEOUT are dropped instead of
+refreshed; if they come back, get() refreshes on demand.
+"""
+import heapq
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from sessions.manager import get_session, update_session
+
+# Refresh this long before the access token expires
+REFRESH_MARGIN = timedelta(minutes=5)
+
+# Stop refreshing in the background after this long without use
+IDLE_TIMEOUT = 900
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+_schedule = []  # heap of (due monotonic time, session_id)
+_schedule_cv = threading.Condition()
+_scheduler = None
+
+
+def _now_like(expiry: datetime) -> datetime:
+    """Current UTC time, naive or aware to match google-auth's expiry."""
+    now = datetime.now(timezone.utc)
+    return now if expiry.tzinfo else now.replace(tzinfo=None)
+
+
+class CredentialManager:
+    """Holds and refreshes the Credentials for a single session."""
+
+    def __init__(self, session_id: str, credentials_json: str):
+        from google.oauth2.credentials import Credentials
+
+        self.session_id = session_id
+        self.credentials_json = credentials_json
+        self.credentials = Credentials.from_authorized_user_info(json.loads(credentials_json))
+        self.last_used = time.monotonic()
+        self._written_token = self.credentials.token
+        self._lock = threading.Lock()
+        self._due = None
+        self._closed = False
+        self._schedule_refresh()
+
+    def get(self):
+        """Return valid credentials, refreshing synchronously only if already expired."""
+        self.last_used = time.monotonic()
+        if self._expires_within(timedelta(0)):
+            self.refresh()
+        elif self.credentials.token != self._written_token:
+            # Refreshed in place by an authorized HTTP client; persist it
+            with self._lock:
+                self._write_back()
+        return self.credentials
+
+    def refresh(self) -> None:
+        """Refresh the access token; concurrent callers share one refresh."""
+        stale_token = self.credentials.token
+        with self._lock:
+            if self.credentials.token != stale_token and not self._expires_within(timedelta(0)):
+                return  # another caller refreshed while we waited
+
+            from google.auth.transport.requests import Request
+
+            self.credentials.refresh(Request())
+            self._write_back()
+        self._schedule_refresh()
+
+    def close(self) -> None:
+        """Cancel background refreshes."""
+        self._closed = True
+        self._due = None
+
+    def _expires_within(self, margin: timedelta) -> bool:
+        expiry = self.credentials.expiry
+        if expiry is None:
+            return not self.credentials.token
+        return _now_like(expiry) + margin >= expiry
+
+    def _write_back(self) -> None:
+        self.credentials_json = self.credentials.to_json()
+        self._written_token = self.credentials.token
+        update_session(self.session_id, {"creds": self.credentials_json})
+
+    def _schedule_refresh(self) -> None:
+        if self._closed or self.credentials.expiry is None:
+            return
+        expiry = self.credentials.expiry
+        delay = max((expiry - REFRESH_MARGIN - _now_like(expiry)).total_seconds(), 0)
+        # Earlier entries for this session are skipped when they come due
+        self._due = time.monotonic() + delay
+        _schedule_at(self._due, self.session_id)
+
+    def _background_refresh(self) -> None:
+        if self._closed:
+            return
+        if time.monotonic() - self.last_used > IDLE_TIMEOUT:
+            forget_credentials(self.session_id)
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Background token refresh failed for session {self.session_id}: {e}")
+
+
+def _schedule_at(due: float, session_id: str) -> None:
+    global _scheduler
+    with _schedule_cv:
+        heapq.heappush(_schedule, (due, session_id))
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=_run_scheduler, name="credential-refresh", daemon=True)
+            _scheduler.start()
+        _schedule_cv.notify()
+
+
+def _run_scheduler() -> None:
+    """Refresh each session's credentials as its entry comes due."""
+    while True:
+        with _schedule_cv:
+            while not _schedule or _schedule[0][0] > time.monotonic():
+                _schedule_cv.wait(_schedule[0][0] - time.monotonic() if _schedule else None)
+            due, session_id = heapq.heappop(_schedule)
+
+        with _managers_lock:
+            manager = _managers.get(session_id)
+        if manager is not None and manager._due == due:
+            manager._background_refresh()
+
+
+def get_credentials(session_id: str):
+    """
+    Return the session's shared Credentials object, or None if not signed in.
+
+    A new manager is created when the session's stored credentials change
+    (e.g. after a fresh OAuth callback). Each call marks the session as in
+    use, so long-running consumers should call again per unit of work (e.g.
+    per page) rather than holding the object past IDLE_TIMEOUT.
+    """
+    session = get_session(session_id)
+    if not session or not session.get("creds"):
+        return None
+
+    with _managers_lock:
+        manager = _managers.get(session_id)
+        if manager is None or manager.credentials_json != session["creds"]:
+            if manager:
+                manager.close()
+            manager = CredentialManager(session_id, session["creds"])
+            _managers[session_id] = manager
+
+    return manager.get()
+
+
+def forget_credentials(session_id: str) -> None:
+    """Drop the cached credentials for a session."""
+    with _managers_lock:
+        manager = _managers.pop(session_id, None)
+    if manager:
+        manager.close()
+
+
+def credentials_from_refresh_token(refresh_token: str):
+    """Build Credentials for a stored refresh token (headless / batch use)."""
+    from google.oauth2.credentials import Credentials
+    from config import get_client_config, SCOPES
+
+    client_config = get_client_config()
+    client = client_config.get("web") or client_config.get("installed") or client_config
+    return Credentials(
+        token=None,
+        refresh_token=refresh_token,
+        client_id=client["client_id"],
+        client_secret=client["client_secret"],
+        token_uri=client.get("token_uri", "https://oauth2.googleapis.com/token"),
+        scopes=SCOPES
+    )
@@ -1,14 +1,21 @@
 """
 OAuth2 authentication module - handles Google OAuth flow.
+
+google_auth_oauthlib is imported on first use to keep cold starts fast.
 """
-from google_auth_oauthlib.flow import Flow
-from config import GOOGLE_CLIENT_CONFIG, SCOPES, REDIRECT_URI
+from typing import TYPE_CHECKING
+from config import get_client_config, SCOPES, REDIRECT_URI
+
+if TYPE_CHECKING:
+    from google_auth_oauthlib.flow import Flow
 
 
-def create_flow(state: str = None) -> Flow:
+def create_flow(state: str = None) -> "Flow":
     """Create and return a Google OAuth flow."""
+    from google_auth_oauthlib.flow import Flow
+
     flow = Flow.from_client_config(
-        GOOGLE_CLIENT_CONFIG,
+        get_client_config(),
         scopes=SCOPES,
         redirect_uri=REDIRECT_URI,
         state=state
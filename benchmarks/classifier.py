@@ -0,0 +1,231 @@
+"""
+Classifier benchmark - accuracy and throughput of BayesianSpamDetector on
+labeled local mail corpora.
+
+Corpora are streamed, never loaded whole; only one (score, label) pair per
+message is kept for the metrics.
+
+    JSONL        one {"subject", "sender", "body", "label"} object per line,
+                 label "spam"/"ham" (or 1/0, true/false)
+    mbox/Maildir every message gets the label given on the command line
+
+Usage:
+    python benchmarks/classifier.py [--jsonl corpus.jsonl] [--spam spam.mbox]
+                                    [--ham ~/Maildir] [--scorer single|batch|both]
+                                    [--batch-size 500] [--no-body] [--json]
+"""
+import argparse
+import json
+import mailbox
+import os
+import resource
+import sys
+import time
+from array import array
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ai_rules import BayesianSpamDetector  # noqa: E402
+
+# Bodies beyond this are truncated; production scores subject + sender only
+MAX_BODY_CHARS = 20000
+
+
+def _parse_label(value) -> int:
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ("spam", "1", "true", "yes"):
+            return 1
+        if value in ("ham", "0", "false", "no"):
+            return 0
+        raise ValueError(f"Unknown label: {value!r}")
+    return int(bool(value))
+
+
+def load_jsonl(path: str):
+    """Yield (subject, sender, body, label) from a JSON-lines corpus."""
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield (
+                record.get("subject", ""),
+                record.get("sender", record.get("from", "")),
+                record.get("body", "")[:MAX_BODY_CHARS],
+                _parse_label(record["label"])
+            )
+
+
+def _text_body(message) -> str:
+    for part in message.walk():
+        if part.get_content_type() == "text/plain" and not part.is_multipart():
+            payload = part.get_payload(decode=True) or b""
+            charset = part.get_content_charset() or "utf-8"
+            return payload[:MAX_BODY_CHARS * 4].decode(charset, errors="replace")[:MAX_BODY_CHARS]
+    return ""
+
+
+def load_mailbox(path: str, label: int):
+    """Yield (subject, sender, body, label) from an mbox file or Maildir directory."""
+    box = mailbox.Maildir(path, create=False) if os.path.isdir(path) else mailbox.mbox(path, create=False)
+    for message in box:
+        yield str(message.get("Subject", "")), str(message.get("From", "")), _text_body(message), label
+
+
+def load_corpora(args):
+    """Chain every corpus given on the command line into one stream."""
+    for path in args.jsonl:
+        yield from load_jsonl(path)
+    for path in args.spam:
+        yield from load_mailbox(path, 1)
+    for path in args.ham:
+        yield from load_mailbox(path, 0)
+
+
+def run_scorer(detector, corpus, scorer: str, batch_size: int, use_body: bool) -> dict:
+    """Stream the corpus through one scorer; return timing and (scores, labels)."""
+    scores = array("d")
+    labels = bytearray()
+    scoring_seconds = 0.0
+    started = time.perf_counter()
+
+    while True:
+        chunk = list(islice(corpus, batch_size))
+        if not chunk:
+            break
+        emails = [(subject, sender, body if use_body else "") for subject, sender, body, _ in chunk]
+
+        scoring_started = time.perf_counter()
+        if scorer == "batch":
+            results = detector.calculate_spam_scores(emails)
+        else:
+            results = [detector.calculate_spam_score(*email) for email in emails]
+        scoring_seconds += time.perf_counter() - scoring_started
+
+        scores.extend(confidence for _, confidence, _ in results)
+        labels.extend(label for *_, label in chunk)
+
+    count = len(scores)
+    return {
+        "scorer": scorer,
+        "messages": count,
+        "scoring_seconds": round(scoring_seconds, 3),
+        "total_seconds": round(time.perf_counter() - started, 3),
+        "messages_per_sec": round(count / scoring_seconds, 1) if scoring_seconds else 0.0,
+        "scores": scores,
+        "labels": labels
+    }
+
+
+def confusion(scores, labels, threshold: float) -> dict:
+    """Precision/recall/F1/accuracy for `score > threshold` means spam."""
+    tp = fp = tn = fn = 0
+    for score, label in zip(scores, labels):
+        if score > threshold:
+            if label:
+                tp += 1
+            else:
+                fp += 1
+        elif label:
+            fn += 1
+        else:
+            tn += 1
+
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "threshold": threshold,
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(f1, 4),
+        "accuracy": round((tp + tn) / len(scores), 4) if len(scores) else 0.0,
+        "false_positive_rate": round(fp / (fp + tn), 4) if fp + tn else 0.0
+    }
+
+
+def roc_auc(scores, labels) -> float:
+    """Area under the ROC curve (Mann-Whitney U, ties count half)."""
+    ranked = sorted(zip(scores, labels))
+    positives = sum(labels)
+    negatives = len(labels) - positives
+    if not positives or not negatives:
+        return float("nan")
+
+    rank_sum = 0.0
+    i = 0
+    while i < len(ranked):
+        j = i
+        while j < len(ranked) and ranked[j][0] == ranked[i][0]:
+            j += 1
+        average_rank = (i + j + 1) / 2  # 1-based ranks i+1..j
+        rank_sum += average_rank * sum(label for _, label in ranked[i:j])
+        i = j
+
+    return (rank_sum - positives * (positives + 1) / 2) / (positives * negatives)
+
+
+def report(run: dict, thresholds: list) -> dict:
+    scores, labels = run.pop("scores"), run.pop("labels")
+    run["spam"] = sum(labels)
+    run["ham"] = len(labels) - run["spam"]
+    run["at_default_threshold"] = confusion(scores, labels, 0.5)
+    run["roc_auc"] = round(roc_auc(scores, labels), 4)
+    run["sweep"] = [confusion(scores, labels, t) for t in thresholds]
+    return run
+
+
+def print_report(run: dict) -> None:
+    default = run["at_default_threshold"]
+    print(f"== {run['scorer']} scorer: {run['messages']} messages ({run['spam']} spam / {run['ham']} ham)")
+    print(f"   {run['messages_per_sec']:.0f} msg/s scoring, {run['total_seconds']:.2f} s total incl. parsing")
+    print(f"   @0.5: precision {default['precision']:.3f}  recall {default['recall']:.3f}  "
+          f"f1 {default['f1']:.3f}  accuracy {default['accuracy']:.3f}")
+    print(f"   ROC AUC {run['roc_auc']:.4f}")
+    print(f"   {'threshold':>9} {'precision':>9} {'recall':>7} {'f1':>6} {'fpr':>6}")
+    for row in run["sweep"]:
+        print(f"   {row['threshold']:>9.2f} {row['precision']:>9.3f} {row['recall']:>7.3f} "
+              f"{row['f1']:>6.3f} {row['false_positive_rate']:>6.3f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jsonl", action="append", default=[], help="labeled JSON-lines corpus")
+    parser.add_argument("--spam", action="append", default=[], help="mbox/Maildir of spam")
+    parser.add_argument("--ham", action="append", default=[], help="mbox/Maildir of ham")
+    parser.add_argument("--scorer", choices=["single", "batch", "both"], default="both")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--no-body", action="store_true", help="score subject + sender only, like production")
+    parser.add_argument("--steps", type=int, default=20, help="threshold sweep steps (default: 20)")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of tables")
+    args = parser.parse_args()
+
+    if not (args.jsonl or args.spam or args.ham):
+        parser.error("give at least one corpus (--jsonl, --spam or --ham)")
+
+    thresholds = [round(i / args.steps, 4) for i in range(1, args.steps)]
+    scorers = ["single", "batch"] if args.scorer == "both" else [args.scorer]
+    detector = BayesianSpamDetector()
+
+    runs = []
+    for scorer in scorers:
+        run = run_scorer(detector, load_corpora(args), scorer, args.batch_size, not args.no_body)
+        runs.append(report(run, thresholds))
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+    if args.json:
+        print(json.dumps({"peak_rss_mb": round(peak_rss_mb, 1), "runs": runs}, indent=2))
+    else:
+        for run in runs:
+            print_report(run)
+        print(f"peak RSS {peak_rss_mb:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Startup benchmark - measures cold import time of the app, per module.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters and
+reports the median self/cumulative time of each imported module.
+
+Usage:
+    python benchmarks/import_time.py [--module main] [--repeat 5] [--top 25]
+                                     [--json] [--budget-ms 500]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_once(module: str) -> dict:
+    """Import module in a fresh interpreter; return {name: (self_us, cumulative_us)}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def measure(module: str, repeat: int) -> list:
+    """Return per-module median timings over several runs, slowest first."""
+    samples = defaultdict(list)
+    for _ in range(repeat):
+        for name, timing in run_once(module).items():
+            samples[name].append(timing)
+
+    rows = []
+    for name, timings in samples.items():
+        rows.append({
+            "module": name,
+            "self_ms": statistics.median(t[0] for t in timings) / 1000,
+            "cumulative_ms": statistics.median(t[1] for t in timings) / 1000,
+        })
+    rows.sort(key=lambda r: -r["cumulative_ms"])
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="module to import (default: main)")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreter runs (default: 5)")
+    parser.add_argument("--top", type=int, default=25, help="modules to show (default: 25)")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    parser.add_argument("--budget-ms", type=float, help="exit 1 if total import time exceeds this")
+    args = parser.parse_args()
+
+    rows = measure(args.module, args.repeat)
+    total_ms = next((r["cumulative_ms"] for r in rows if r["module"] == args.module), 0.0)
+
+    if args.json:
+        print(json.dumps({"module": args.module, "total_ms": total_ms, "modules": rows[:args.top]}, indent=2))
+    else:
+        print(f"import {args.module}: {total_ms:.1f} ms (median of {args.repeat})")
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for row in rows[:args.top]:
+            print(f"{row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}  {row['module']}")
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"Import time {total_ms:.1f} ms exceeds budget {args.budget_ms:.1f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Gmail Cleaner Pro - headless batch cleanup for many managed accounts.
+
+Reads a JSON-lines accounts file, one account per line:
+
+    {"account": "alice@example.com", "refresh_token": "1//...",
+     "filters": {"unread": true, "promotions": true, "age": "30d"},
+     "restore": false}
+
+"filters" takes the same options as the web form (see services/queries.py);
+"queries" may be given instead to pass Gmail queries verbatim (in: operators
+are rejected), and "rules" adds custom rules (see services/rules.py).
+Accounts are cleaned concurrently under a global --concurrency budget and
+one JSON result line per account is written as soon as it finishes.
+
+Usage:
+    python cli.py accounts.jsonl [--concurrency 16] [--output results.jsonl]
+                                 [--dry-run] [--profile] [--http2]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from auth.credentials import credentials_from_refresh_token
+from services.gmail_service import build_service_from_credentials, list_messages, move_to_trash, restore_read_from_trash
+from services.profiling import profile
+from services.queries import build_queries, check_cleanup_query
+from services.rules import CompiledRule, compile_rules, filter_messages
+
+
+def account_rules(spec: dict) -> list:
+    """Compiled rules (queries plus local filters) for one account spec."""
+    rules = compile_rules(spec.get("rules", []))
+    if spec.get("queries"):
+        queries = [check_cleanup_query(q) for q in dict.fromkeys(spec["queries"])]
+    elif rules and not spec.get("filters"):
+        queries = []
+    else:
+        filters = spec.get("filters", {})
+        queries = build_queries(
+            unread=bool(filters.get("unread")),
+            promotions=bool(filters.get("promotions")),
+            social=bool(filters.get("social")),
+            updates=bool(filters.get("updates")),
+            age=filters.get("age", "")
+        )
+    return [CompiledRule(q) for q in queries] + rules
+
+
+async def clean_rules(rules: list, counts: dict, dry_run: bool, list_page, select_ids, trash) -> None:
+    """
+    List, filter and trash every rule's matches, recording a count per query
+    in `counts` as each rule finishes.
+
+    list_page(query, page_token), select_ids(rule, messages) and trash(ids)
+    are coroutine functions, so the same loop drives both the googleapiclient
+    and the HTTP/2 client.
+    """
+    for rule in rules:
+        query_count = 0
+        next_page_token = None
+        trashed = set()
+        while True:
+            messages, next_page_token = await list_page(rule.query, next_page_token)
+            if not messages or all(m['id'] in trashed for m in messages):
+                break  # done, or the query still matches what we trashed
+            ids = await select_ids(rule, messages)
+            if not dry_run:
+                await trash(ids)
+                trashed.update(ids)
+            query_count += len(ids)
+            if not next_page_token:
+                break
+            if not dry_run and rule.local_filter is None:
+                # Trashed messages drop out of the query; re-list from the start
+                next_page_token = None
+
+        counts[rule.query] = query_count
+
+
+def clean_account(spec: dict, dry_run: bool = False, profiled: bool = False) -> dict:
+    """Clean one account synchronously and return its result record."""
+    account = spec.get("account", "unknown")
+    started = time.monotonic()
+    result = {"account": account, "status": "ok", "dry_run": dry_run, "queries": {}, "emails_deleted": 0}
+
+    try:
+        with profile(f"cli-{account.replace('@', '_at_')}", enabled=profiled):
+            creds = credentials_from_refresh_token(spec["refresh_token"])
+            service = build_service_from_credentials(creds)
+
+            async def list_page(query, page_token):
+                return list_messages(service, query, page_token=page_token)
+
+            async def select_ids(rule, messages):
+                return filter_messages(service, rule, messages)
+
+            async def trash(ids):
+                move_to_trash(service, ids)
+
+            # Runs on this worker thread's own loop; every call above blocks it
+            asyncio.run(clean_rules(account_rules(spec), result["queries"], dry_run, list_page, select_ids, trash))
+
+            if spec.get("restore") and not dry_run:
+                result["restored"] = restore_read_from_trash(service)
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    result["emails_deleted"] = sum(result["queries"].values())
+    result["elapsed_s"] = round(time.monotonic() - started, 2)
+    return result
+
+
+async def clean_account_async(spec: dict, dry_run: bool = False) -> dict:
+    """clean_account over the pooled HTTP/2 client (services/gmail_async.py)."""
+    from services import gmail_async
+
+    account = spec.get("account", "unknown")
+    started = time.monotonic()
+    result = {"account": account, "status": "ok", "dry_run": dry_run, "queries": {}, "emails_deleted": 0}
+
+    try:
+        creds = credentials_from_refresh_token(spec["refresh_token"])
+
+        async def list_page(query, page_token):
+            return await gmail_async.list_messages(creds, query, page_token=page_token)
+
+        async def select_ids(rule, messages):
+            ids = [m['id'] for m in messages]
+            if rule.local_filter is None:
+                return ids
+            metadata = await gmail_async.get_messages_metadata(creds, ids, headers=rule.local_filter.headers)
+            mask = rule.local_filter.apply(metadata)
+            return [m["id"] for m, keep in zip(metadata, mask) if keep]
+
+        async def trash(ids):
+            await gmail_async.move_to_trash(creds, ids)
+
+        await clean_rules(account_rules(spec), result["queries"], dry_run, list_page, select_ids, trash)
+
+        if spec.get("restore") and not dry_run:
+            result["restored"] = await gmail_async.restore_read_from_trash(creds)
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    result["emails_deleted"] = sum(result["queries"].values())
+    result["elapsed_s"] = round(time.monotonic() - started, 2)
+    return result
+
+
+def read_accounts(path: str):
+    """Yield account specs from a JSON-lines file, skipping blanks and comments."""
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            spec = json.loads(line)
+            if "refresh_token" not in spec:
+                raise ValueError(f"{path}:{line_no}: missing refresh_token")
+            yield spec
+
+
+async def run(specs, out, concurrency: int, dry_run: bool, profiled: bool, http2: bool = False) -> dict:
+    """Clean all accounts with at most `concurrency` running at once."""
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    budget = asyncio.Semaphore(concurrency)
+    summary = {"accounts": 0, "failed": 0, "emails_deleted": 0}
+
+    async def worker(spec):
+        async with budget:
+            if http2:
+                result = await clean_account_async(spec, dry_run)
+            else:
+                result = await asyncio.to_thread(clean_account, spec, dry_run, profiled)
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        summary["accounts"] += 1
+        summary["emails_deleted"] += result["emails_deleted"]
+        if result["status"] != "ok":
+            summary["failed"] += 1
+
+    if http2:
+        from services.gmail_async import close_client
+
+        # All accounts share the event loop thread, so profile the batch as one job
+        with profile("cli-batch", enabled=profiled):
+            try:
+                await asyncio.gather(*(worker(spec) for spec in specs))
+            finally:
+                await close_client()
+    else:
+        await asyncio.gather(*(worker(spec) for spec in specs))
+    return summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("accounts", help="JSON-lines file of account specs")
+    parser.add_argument("--concurrency", type=int, default=16, help="accounts cleaned at once (default: 16)")
+    parser.add_argument("--output", help="write results here instead of stdout")
+    parser.add_argument("--dry-run", action="store_true", help="count matching emails without trashing")
+    parser.add_argument("--profile", action="store_true", help="write a profile per account (see PROFILE_DIR)")
+    parser.add_argument("--http2", action="store_true", help="use the async HTTP/2 client (needs httpx[http2])")
+    args = parser.parse_args()
+
+    specs = list(read_accounts(args.accounts))
+    out = open(args.output, "a") if args.output else sys.stdout
+    try:
+        summary = asyncio.run(run(specs, out, args.concurrency, args.dry_run, args.profile, args.http2))
+    finally:
+        if args.output:
+            out.close()
+
+    print(
+        f"{summary['accounts']} accounts, {summary['failed']} failed, "
+        f"{summary['emails_deleted']} emails {'matched' if args.dry_run else 'deleted'}",
+        file=sys.stderr
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,54 @@
 """
 Configuration module - loads and manages environment variables.
+
+The OAuth client config is parsed on first use (get_client_config) so that
+importing the app stays cheap on cold start.
 """
 import os
 import json
+from functools import lru_cache
 
 # Gmail API scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 
 # OAuth2 config
-GOOGLE_CLIENT_CONFIG = json.loads(os.environ.get("GOOGLE_CLIENT_CONFIG_JSON", "{}"))
 REDIRECT_URI = os.environ.get("REDIRECT_URI", "http://localhost:8000/auth/callback")
 
 # Ensure insecure transport for local development
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
 # Validation
-if not GOOGLE_CLIENT_CONFIG:
-    raise ValueError("GOOGLE_CLIENT_CONFIG_JSON environment variable not set")
 if not REDIRECT_URI:
     raise ValueError("REDIRECT_URI environment variable not set")
+
+
+@lru_cache(maxsize=1)
+def get_client_config() -> dict:
+    """Parse and validate GOOGLE_CLIENT_CONFIG_JSON on first use."""
+    client_config = json.loads(os.environ.get("GOOGLE_CLIENT_CONFIG_JSON", "{}"))
+    if not client_config:
+        raise ValueError("GOOGLE_CLIENT_CONFIG_JSON environment variable not set")
+    return client_config
+
+
+def __getattr__(name):
+    # Backwards compatible access to config.GOOGLE_CLIENT_CONFIG
+    if name == "GOOGLE_CLIENT_CONFIG":
+        return get_client_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Local backups of trashed emails (see services/backup.py)
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "backups")
+
+# Saved spam model corrections per account (see services/learning.py)
+LEARNING_DIR = os.environ.get("LEARNING_DIR", "learning")
+
+# Warm up heavy modules at startup instead of on the first request
+WARM_UP_ON_STARTUP = os.environ.get("WARM_UP_ON_STARTUP", "").lower() in ("1", "true", "yes")
+
+# Profiling (opt-in, see services/profiling.py)
+PROFILE_ADMIN_TOKEN = os.environ.get("PROFILE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
@@ -7,16 +7,22 @@ This is the main application entry point. All business logic is modularized:
 - services/: Gmail API interactions
 - routes/: HTTP endpoints
 - sessions/: User session management
+
+Heavy dependencies (Google client libraries, the spam classifier) load on
+first use; warm_up() loads them ahead of time on startup or via /warmup.
 """
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from config import WARM_UP_ON_STARTUP
 
 # Import routes
 from routes.home import router as home_router
 from routes.auth_routes import router as auth_router
 from routes.progress import router as progress_router
+from routes.preview import router as preview_router
+from routes.senders import router as senders_router
+from routes.storage import router as storage_router
 
 # Initialize FastAPI app
 app = FastAPI(title="Gmail Cleaner Pro", version="1.0.0")
@@ -34,6 +40,35 @@ app.add_middleware(
 app.include_router(home_router)
 app.include_router(auth_router)
 app.include_router(progress_router)
+app.include_router(preview_router)
+app.include_router(senders_router)
+app.include_router(storage_router)
+
+
+def warm_up() -> None:
+    """Import and initialize everything that is deferred to first use."""
+    import googleapiclient.discovery  # noqa: F401
+    import google_auth_oauthlib.flow  # noqa: F401
+    from config import get_client_config
+    from services.ai_rules import get_detector
+
+    get_client_config()
+    get_detector()
+
+
+@app.on_event("startup")
+def startup_warm_up():
+    """Warm up on startup when WARM_UP_ON_STARTUP is set (long-lived servers)."""
+    if WARM_UP_ON_STARTUP:
+        warm_up()
+
+
+@app.on_event("shutdown")
+async def close_async_gmail_client():
+    """Close the pooled HTTP/2 Gmail client if it was used."""
+    from services.gmail_async import close_client
+
+    await close_client()
 
 
 @app.get("/health")
@@ -42,6 +77,13 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/warmup")
+def warmup():
+    """Warm-up endpoint for serverless platforms (e.g. a Vercel cron)."""
+    warm_up()
+    return {"status": "warm"}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
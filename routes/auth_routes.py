@@ -1,17 +1,24 @@
 """
 OAuth and authentication routes.
 """
+import os
+import json
 from fastapi import APIRouter, Request, Form
 from fastapi.responses import RedirectResponse, JSONResponse
 from auth.oauth import get_authorization_url, get_credentials_from_callback
 from sessions.manager import create_session, update_session, get_session
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-import json
-from datetime import datetime
+from services.gmail_service import build_session_service, get_session_account, restore_from_trash
+from services.queries import build_queries
+from services.rules import compile_rules, RuleError
+from services.backup import list_runs, open_run, restore_from_archive
+from services import query_cache
+from services.learning import record_message_corrections
 
 router = APIRouter()
 
+# Gmail accepts up to 1000 ids per batchModify
+RESTORE_CHUNK = 1000
+
 
 @router.post("/start")
 def start(
@@ -22,52 +29,43 @@ def start(
     age: str = Form(""),
     restore: str = Form(None),
     enable_spam_detection: str = Form(None),
-    enable_preview: str = Form(None)
+    enable_preview: str = Form(None),
+    enable_backup: str = Form(None),
+    rules: str = Form("")
 ):
     """
     Start the cleaning process - build filters and initiate OAuth.
+    Custom rules (a JSON list, see services/rules.py) replace the filters.
     """
-    # Build query list with safety filter (only unread emails)
-    base_filter = "is:unread"
-    queries = []
-    
-    if unread:
-        queries.append(base_filter)
-    
-    if promotions:
-        queries.append(f"{base_filter} category:promotions")
-    
-    if social:
-        queries.append(f"{base_filter} category:social")
-    
-    if updates:
-        queries.append(f"{base_filter} category:updates")
-    
-    # Add age filter if selected
-    if age:
-        queries = [q + f" older_than:{age}" for q in queries]
-    
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_queries = []
-    for q in queries:
-        if q not in seen:
-            seen.add(q)
-            unique_queries.append(q)
-    queries = unique_queries
-    
-    # If no specific filters selected, default to unread only
-    if not queries:
-        queries = [base_filter]
-        if age:
-            queries = [f"{base_filter} older_than:{age}"]
+    rule_list = []
+    if rules.strip():
+        try:
+            rule_list = json.loads(rules)
+            if isinstance(rule_list, dict):
+                rule_list = [rule_list]
+            compile_rules(rule_list)
+        except (RuleError, ValueError, TypeError, AttributeError) as e:
+            return JSONResponse({"error": f"Invalid rules: {e}"}, status_code=400)
+    
+    if rule_list:
+        queries = []
+    else:
+        queries = build_queries(
+            unread=bool(unread),
+            promotions=bool(promotions),
+            social=bool(social),
+            updates=bool(updates),
+            age=age
+        )
     
     # Create session with new options
     session_id = create_session(
         queries, 
         bool(restore),
         enable_spam_detection=bool(enable_spam_detection),
-        enable_preview=bool(enable_preview)
+        enable_preview=bool(enable_preview),
+        enable_backup=bool(enable_backup),
+        rules=rule_list
     )
     
     # Get OAuth authorization URL
@@ -99,13 +97,19 @@ def callback(request: Request):
     )
     
     # Store credentials in session
-    update_session(session_id, {"creds": creds.to_json()})
+    update_session(session_id, {"creds": creds.to_json(), "account": None})
+    
+    # Backups and personal models are keyed by account, not session
+    try:
+        get_session_account(session_id)
+    except Exception as e:
+        print(f"Failed to look up account for session: {e}")
     
     return RedirectResponse("/progress_page")
 
 
 @router.post("/api/undo-session")
-async def undo_session(request: Request):
+def undo_session(request: Request):
     """
     Restore emails from last cleanup session (undo functionality).
     """
@@ -133,18 +137,37 @@ async def undo_session(request: Request):
                 "message": "No emails to restore from last session"
             })
         
-        # Restore emails from trash
-        creds = Credentials.from_authorized_user_info(json.loads(session["creds"]))
-        service = build('gmail', 'v1', credentials=creds)
+        # Restore emails from trash in batchModify chunks
+        service = build_session_service(session_id)
         
-        restored_count = 0
-        for email_id in deleted_ids:
+        restored_ids = []
+        for start in range(0, len(deleted_ids), RESTORE_CHUNK):
+            chunk = deleted_ids[start:start + RESTORE_CHUNK]
             try:
-                service.users().messages().untrash(userId='me', id=email_id).execute()
-                restored_count += 1
+                restore_from_trash(service, chunk)
+                restored_ids.extend(chunk)
             except Exception as e:
-                print(f"Failed to restore email {email_id}: {e}")
-                continue
+                print(f"Failed to restore {len(chunk)} emails: {e}")
+        restored_count = len(restored_ids)
+        
+        # Whatever failed stays in history so undo can be retried
+        restored = set(restored_ids)
+        remaining = [email_id for email_id in deleted_ids if email_id not in restored]
+        if remaining:
+            last_cleanup["email_ids"] = remaining
+        else:
+            cleanup_history.pop()
+        
+        # Restored emails were wrongly cleaned: teach the personal model they are ham
+        if restored_ids:
+            try:
+                record_message_corrections(
+                    service, get_session_account(session_id), restored_ids, False, cache_key=session_id
+                )
+            except Exception as e:
+                print(f"Failed to record undo corrections: {e}")
+        
+        query_cache.invalidate(session_id, restored_ids)
         
         return JSONResponse({
             "success": True,
@@ -157,3 +180,75 @@ async def undo_session(request: Request):
             "success": False,
             "message": str(e)
         }, status_code=500)
+
+
+@router.get("/api/backups")
+def backups(request: Request):
+    """
+    List the local backup runs for the signed-in account, newest first.
+    """
+    session_id = request.cookies.get("session_id")
+    session = get_session(session_id)
+    
+    if not session:
+        return JSONResponse({"error": "Session not found"}, status_code=401)
+    
+    try:
+        account = get_session_account(session_id)
+        runs = []
+        for run in reversed(list_runs(account)):
+            archive = open_run(account, run)
+            runs.append({
+                "run": run,
+                "emails": sum(1 for _ in archive.iter_index()),
+                "restored": len(archive.restored_ids())
+            })
+        return JSONResponse({"account": account, "runs": runs})
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@router.post("/api/restore-backup")
+def restore_backup(request: Request, data: dict = None):
+    """
+    Re-import emails from the account's local backup (for emails that have
+    already been purged from Trash). Body: {"run": ..., "ids": [...]}, both
+    optional; defaults to every email in the latest run.
+    """
+    session_id = request.cookies.get("session_id")
+    session = get_session(session_id)
+    
+    if not session:
+        return JSONResponse({"error": "Session not found", "success": False}, status_code=401)
+    
+    data = data or {}
+    ids = data.get("ids")
+    if ids is not None and not isinstance(ids, list):
+        return JSONResponse({"error": "ids must be a list", "success": False}, status_code=400)
+    
+    try:
+        account = get_session_account(session_id)
+        archive = open_run(account, data.get("run"))
+        if archive is None:
+            return JSONResponse({
+                "success": False,
+                "message": "No local backup found for this account"
+            })
+        
+        service = build_session_service(session_id)
+        restored_count, skipped = restore_from_archive(service, archive, set(ids) if ids is not None else None)
+        query_cache.invalidate(session_id)
+        
+        return JSONResponse({
+            "success": True,
+            "run": os.path.basename(archive.directory),
+            "emails_restored": restored_count,
+            "emails_skipped": skipped,
+            "message": f"Restored {restored_count} emails from backup ({skipped} already in mailbox or restored)"
+        })
+        
+    except Exception as e:
+        return JSONResponse({
+            "success": False,
+            "message": str(e)
+        }, status_code=500)
@@ -1,26 +1,46 @@
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse, JSONResponse
-from jinja2 import Template
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-import json, os
-from datetime import datetime
-from services.ai_rules import detect_spam_bayesian, calculate_email_stats
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from functools import lru_cache
+from pathlib import Path
+from services.ai_rules import detect_spam_bayesian, get_detector
+from services.gmail_service import (
+    build_session_service, list_messages, get_messages_metadata, count_messages, get_session_account
+)
+from services.learning import record_message_corrections
+from services.profiling import should_profile, profile, timed
+from sessions.manager import get_session
 
 router = APIRouter()
 
-def get_preview(service, query, max_results=15):
+template_path = Path(__file__).parent.parent / "templates" / "preview.html"
+
+
+@lru_cache(maxsize=1)
+def get_preview_template():
+    """Compile the preview template once, on first use."""
+    from jinja2 import Template
+
+    return Template(template_path.read_text())
+
+
+@timed("preview.get_preview")
+def get_preview(service, query, max_results=15, cache_key=None, user=None):
     """Get preview of emails matching query"""
-    results = service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
+    messages, _ = list_messages(service, query, max_results=max_results, cache_key=cache_key)
+    metadata = get_messages_metadata(
+        service, [m['id'] for m in messages], headers=['Subject', 'From', 'Date'], cache_key=cache_key
+    )
     previews = []
 
-    for msg in results.get("messages", []):
-        data = service.users().messages().get(
-            userId='me', id=msg['id'], format='metadata',
-            metadataHeaders=['Subject','From','Date']
-        ).execute()
-
-        headers = {h['name']:h['value'] for h in data['payload']['headers']}
+    for msg in metadata:
+        headers = msg["headers"]
         preview_item = {
             "id": msg['id'],
             "subject": headers.get("Subject","No Subject"),
@@ -33,7 +53,8 @@ def get_preview(service, query, max_results=15):
             is_spam, confidence, explanation = detect_spam_bayesian(
                 preview_item["subject"],
                 preview_item["from"],
-                ""
+                "",
+                user=user
             )
             preview_item["spam_score"] = round(confidence * 100)
             preview_item["is_spam"] = is_spam
@@ -48,28 +69,160 @@ def get_preview(service, query, max_results=15):
     return previews
 
 
+def _encode_cursor(query: str, page_token: str) -> str:
+    """Wrap a Gmail page token in an opaque cursor bound to its query."""
+    payload = {"q": hashlib.sha1(query.encode()).hexdigest()[:12], "t": page_token}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(query: str, cursor: str) -> str:
+    """Return the Gmail page token in a cursor; ValueError if invalid or for another query."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        query_hash, page_token = payload["q"], payload["t"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(page_token, str) or not page_token:
+        raise ValueError("Invalid cursor")
+    if query_hash != hashlib.sha1(query.encode()).hexdigest()[:12]:
+        raise ValueError("Cursor does not belong to this query")
+    return page_token
+
+
+@timed("preview.fetch_preview_page")
+def fetch_preview_page(session_id: str, query: str, page_token: str, page_size: int) -> tuple:
+    """List one page and fetch its metadata in batches. Returns (items, next_page_token)."""
+    # googleapiclient services are not thread-safe; each fetch builds its own
+    service = build_session_service(session_id)
+    messages, next_page_token = list_messages(
+        service, query, max_results=page_size, page_token=page_token, cache_key=session_id
+    )
+    metadata = get_messages_metadata(
+        service, [m['id'] for m in messages], headers=['Subject', 'From', 'Date'], cache_key=session_id
+    )
+
+    items = []
+    for message in metadata:
+        headers = message["headers"]
+        items.append({
+            "id": message["id"],
+            "subject": headers.get("Subject", "No Subject"),
+            "from": headers.get("From", "Unknown"),
+            "date": headers.get("Date", "Unknown"),
+            "size": message["size"]
+        })
+
+    account = (get_session(session_id) or {}).get("account")
+    scores = get_detector(account).calculate_spam_scores((item["subject"], item["from"], "") for item in items)
+    for item, (is_spam, confidence, explanation) in zip(items, scores):
+        item["spam_score"] = round(confidence * 100)
+        item["is_spam"] = is_spam
+        item["spam_explanation"] = explanation
+
+    return items, next_page_token
+
+
+# Next page of each session's stream, fetched while the client renders the current one.
+# Abandoned prefetches expire after PREFETCH_TTL; at most MAX_PREFETCHED are kept.
+PREFETCH_TTL = 60.0
+MAX_PREFETCHED = 256
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="preview-prefetch")
+_prefetched = OrderedDict()  # session_id -> (request key, future, created_at), oldest first
+
+
+def _evict_prefetches() -> None:
+    """Drop expired entries, then the oldest ones while over MAX_PREFETCHED."""
+    expired_before = time.monotonic() - PREFETCH_TTL
+    while _prefetched:
+        session_id, (_, future, created_at) = next(iter(_prefetched.items()))
+        if created_at > expired_before and len(_prefetched) <= MAX_PREFETCHED:
+            break
+        del _prefetched[session_id]
+        future.cancel()
+
+
+def _prefetch(session_id: str, query: str, page_token: str, page_size: int) -> None:
+    previous = _prefetched.pop(session_id, None)
+    if previous:
+        previous[1].cancel()
+    future = _prefetch_pool.submit(fetch_preview_page, session_id, query, page_token, page_size)
+    _prefetched[session_id] = ((query, page_token, page_size), future, time.monotonic())
+    _evict_prefetches()
+
+
+async def _get_page(session_id: str, query: str, page_token: str, page_size: int) -> tuple:
+    # Any request consumes the session's prefetch; a different query or cursor discards it
+    prefetched = _prefetched.pop(session_id, None)
+    if prefetched:
+        key, future, created_at = prefetched
+        if key == (query, page_token, page_size) and time.monotonic() - created_at <= PREFETCH_TTL:
+            try:
+                return await asyncio.wrap_future(future)
+            except Exception:
+                pass  # fall through and fetch it again
+        else:
+            future.cancel()
+    return await asyncio.to_thread(fetch_preview_page, session_id, query, page_token, page_size)
+
+
+@router.get("/api/preview/stream")
+async def preview_stream(request: Request, query: str, cursor: str = None, page_size: int = 100):
+    """
+    Stream one page of matching emails as NDJSON: one line per email, then a
+    final {"next_cursor", "count"} line. Pass next_cursor back to get the next
+    page; it is null after the last page. The following page is prefetched.
+    """
+    session_id = request.cookies.get("session_id")
+    if not get_session(session_id):
+        return JSONResponse({"error": "Session not found"}, status_code=401)
+
+    page_size = max(1, min(page_size, 500))
+    try:
+        page_token = _decode_cursor(query, cursor) if cursor else None
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    try:
+        items, next_page_token = await _get_page(session_id, query, page_token, page_size)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+    if next_page_token:
+        _prefetch(session_id, query, next_page_token, page_size)
+
+    async def lines():
+        for item in items:
+            yield json.dumps(item) + "\n"
+        yield json.dumps({
+            "next_cursor": _encode_cursor(query, next_page_token) if next_page_token else None,
+            "count": len(items)
+        }) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @router.get("/preview", response_class=HTMLResponse)
 def preview(query: str, request: Request):
     """Show preview of emails before deletion"""
     session_id = request.cookies.get("session_id")
-    session = request.app.state.SESSIONS.get(session_id)
+    session = get_session(session_id)
 
-    creds = Credentials.from_authorized_user_info(json.loads(session["creds"]))
-    service = build('gmail', 'v1', credentials=creds)
+    with profile("preview", enabled=should_profile(request)):
+        service = build_session_service(session_id)
 
-    mails = get_preview(service, query, max_results=15)
+        mails = get_preview(service, query, max_results=15, cache_key=session_id, user=session.get("account"))
     
     # Calculate stats
     total = len(mails)
     spam_count = sum(1 for m in mails if m.get("is_spam"))
     
-    with open("templates/preview.html") as f:
-        html = Template(f.read()).render(
-            mails=mails,
-            query=query,
-            total=total,
-            spam_count=spam_count
-        )
+    html = get_preview_template().render(
+        mails=mails,
+        query=query,
+        total=total,
+        spam_count=spam_count
+    )
 
     return HTMLResponse(html)
 
@@ -81,17 +234,16 @@ async def preview_stats(request: Request):
     query = data.get("query", "")
     
     session_id = request.cookies.get("session_id")
-    session = request.app.state.SESSIONS.get(session_id)
+    session = get_session(session_id)
     
     if not session:
         return JSONResponse({"error": "Session not found"}, status_code=401)
 
     try:
-        creds = Credentials.from_authorized_user_info(json.loads(session["creds"]))
-        service = build('gmail', 'v1', credentials=creds)
-        
-        results = service.users().messages().list(userId='me', q=query, maxResults=1).execute()
-        total_count = results.get('resultSizeEstimate', 0)
+        with profile("preview-stats", enabled=should_profile(request)):
+            service = build_session_service(session_id)
+            
+            total_count = count_messages(service, query, cache_key=session_id)
         
         return JSONResponse({
             "total_emails": total_count,
@@ -106,10 +258,34 @@ async def preview_stats(request: Request):
 async def session_history(request: Request):
     """Get cleanup session history for undo functionality"""
     session_id = request.cookies.get("session_id")
-    session = request.app.state.SESSIONS.get(session_id)
+    session = get_session(session_id)
     
     if not session:
         return JSONResponse({"error": "Session not found"}, status_code=401)
     
     history = session.get("cleanup_history", [])
     return JSONResponse({"history": history})
+
+
+@router.post("/api/feedback")
+def feedback(request: Request, data: dict):
+    """
+    Record spam/ham corrections for the user's personal model, e.g. emails
+    unchecked in the preview ({"ids": [...], "label": "ham"}).
+    """
+    session_id = request.cookies.get("session_id")
+    if not get_session(session_id):
+        return JSONResponse({"error": "Session not found"}, status_code=401)
+
+    ids = data.get("ids") or []
+    label = data.get("label", "ham")
+    if label not in ("spam", "ham") or not isinstance(ids, list):
+        return JSONResponse({"error": "Expected ids and a spam/ham label"}, status_code=400)
+
+    try:
+        service = build_session_service(session_id)
+        account = get_session_account(session_id)
+        recorded = record_message_corrections(service, account, ids, label == "spam", cache_key=session_id)
+        return JSONResponse({"success": True, "recorded": recorded})
+    except Exception as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=500)
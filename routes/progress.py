@@ -5,8 +5,14 @@ import asyncio
 from fastapi import APIRouter, Request
 from fastapi.responses import FileResponse, StreamingResponse
 from pathlib import Path
-from services.gmail_service import build_service, list_messages, move_to_trash, restore_read_from_trash
-from sessions.manager import get_session
+from auth.credentials import get_credentials
+from services import gmail_async
+from services.gmail_service import build_session_service, get_session_account, restore_read_from_trash
+from services.backup import backup_messages, new_run_archive
+from services.query_cache import listed_ids
+from services.rules import CompiledRule, compile_rules, filter_messages
+from services.profiling import should_profile, profile_stream
+from sessions.manager import get_session, add_cleanup_history
 
 router = APIRouter()
 
@@ -32,21 +38,27 @@ async def progress(request: Request):
             yield "data: Error: Session not found\n\n"
             return
         
-        # Build Gmail service from credentials
+        # Build Gmail service from credentials; listing and trashing go through
+        # the pooled async client so they do not block the event loop
         try:
-            service = build_service(session["creds"])
+            service = build_session_service(session_id)
+            creds = get_credentials(session_id)
         except Exception as e:
             yield f"data: Error building service: {str(e)}\n\n"
             return
         
+        # Personal spam models are keyed by account (None: shared model)
+        account = session.get("account")
         total_deleted = 0
+        deleted_ids = []
         found_any = False
         spam_detected = 0
         
         yield "data: 🔍 Starting inbox cleanup...\n\n"
         
-        # Get unique queries to avoid duplicates
-        queries = list(set(session.get("queries", [])))
+        # Get unique queries to avoid duplicates; custom rules add their own
+        queries = [CompiledRule(q) for q in dict.fromkeys(session.get("queries", []))]
+        queries += compile_rules(session.get("rules", []))
         
         if not queries:
             yield "data: No filters selected\n\n"
@@ -58,64 +70,112 @@ async def progress(request: Request):
             yield "data: 🤖 AI Spam Detection enabled\n\n"
             from services.ai_rules import detect_spam_bayesian
         
-        # Process each query only once
-        for i, query in enumerate(queries, 1):
-            yield f"data: [{i}/{len(queries)}] Processing: {query}\n\n"
-            next_page_token = None
-            query_deleted = 0
-            query_spam = 0
-            
+        # Back up raw emails locally before trashing them, keyed by account so
+        # the archive outlives this session
+        archive = None
+        if session.get("enable_backup"):
             try:
-                while True:
-                    messages, next_page_token = list_messages(service, query, page_token=next_page_token)
-                    
-                    if not messages:
-                        if query_deleted > 0:
-                            if spam_detection_enabled:
-                                yield f"data: ✓ '{query}': {query_deleted} deleted ({query_spam} flagged as spam)\n\n"
-                            else:
-                                yield f"data: ✓ '{query}': {query_deleted} deleted\n\n"
-                        break
-                    
-                    found_any = True
-                    ids = [m['id'] for m in messages]
-                    
-                    # Analyze spam if enabled
-                    if spam_detection_enabled:
-                        for msg in messages:
-                            try:
-                                subject = msg['payload']['headers'].get('Subject', '')
-                                sender = msg['payload']['headers'].get('From', '')
-                                is_spam, confidence, _ = detect_spam_bayesian(subject, sender, "")
-                                if is_spam:
-                                    query_spam += 1
-                            except:
-                                pass
-                    
-                    move_to_trash(service, ids)
-                    
-                    query_deleted += len(ids)
-                    total_deleted += len(ids)
-                    spam_detected += query_spam
-                    
-                    if spam_detection_enabled:
-                        yield f"data: Progress: {total_deleted} emails deleted ({spam_detected} spam detected)\n\n"
-                    else:
-                        yield f"data: Progress: {total_deleted} emails deleted...\n\n"
-                    
-                    await asyncio.sleep(0.2)
-                    
-                    if not next_page_token:
-                        break
+                archive = new_run_archive(get_session_account(session_id))
             except Exception as e:
-                yield f"data: Error processing '{query}': {str(e)}\n\n"
-                continue
+                yield f"data: Error preparing local backup: {str(e)}\n\n"
+                return
+            yield "data: 💾 Local backup enabled\n\n"
+        
+        # Process each query only once
+        try:
+            for i, rule in enumerate(queries, 1):
+                query = rule.query
+                yield f"data: [{i}/{len(queries)}] Processing: {query}\n\n"
+                next_page_token = None
+                query_deleted = 0
+                query_spam = 0
+                
+                # Start from IDs a preview already listed instead of listing them again
+                cached_ids = listed_ids(session_id, query)
+                
+                try:
+                    while True:
+                        # Re-fetch per page so a long run counts as in use: the manager keeps
+                        # refreshing it in the background and persists refreshed tokens
+                        creds = get_credentials(session_id) or creds
+                        
+                        if cached_ids:
+                            messages = [{'id': msg_id} for msg_id in cached_ids[:500]]
+                            cached_ids = cached_ids[500:]
+                            # Trashed IDs leave the query, so listing resumes from the first page
+                            next_page_token = None
+                            from_cache = True
+                        else:
+                            messages, next_page_token = await gmail_async.list_messages(
+                                creds, query, page_token=next_page_token
+                            )
+                            from_cache = False
+                        
+                        if not messages:
+                            if query_deleted > 0:
+                                if spam_detection_enabled:
+                                    yield f"data: ✓ '{query}': {query_deleted} deleted ({query_spam} flagged as spam)\n\n"
+                                else:
+                                    yield f"data: ✓ '{query}': {query_deleted} deleted\n\n"
+                            break
+                        
+                        found_any = True
+                        # Conditions Gmail could not search on are checked on headers here;
+                        # googleapiclient blocks, so batch fetches run off the event loop
+                        ids = await asyncio.to_thread(
+                            filter_messages, service, rule, messages, cache_key=session_id, user=account
+                        )
+                        
+                        # Analyze spam if enabled
+                        if spam_detection_enabled:
+                            for msg in messages:
+                                try:
+                                    subject = msg['payload']['headers'].get('Subject', '')
+                                    sender = msg['payload']['headers'].get('From', '')
+                                    is_spam, confidence, _ = detect_spam_bayesian(subject, sender, "", user=account)
+                                    if is_spam:
+                                        query_spam += 1
+                                except:
+                                    pass
+                        
+                        if archive:
+                            backed_up = await asyncio.to_thread(backup_messages, service, ids, archive)
+                            if len(backed_up) < len(ids):
+                                yield f"data: Warning: {len(ids) - len(backed_up)} emails could not be backed up and were kept\n\n"
+                            ids = [msg_id for msg_id in ids if msg_id in backed_up]
+                        
+                        await gmail_async.move_to_trash(creds, ids, cache_key=session_id)
+                        
+                        query_deleted += len(ids)
+                        total_deleted += len(ids)
+                        deleted_ids.extend(ids)
+                        spam_detected += query_spam
+                        
+                        if spam_detection_enabled:
+                            yield f"data: Progress: {total_deleted} emails deleted ({spam_detected} spam detected)\n\n"
+                        else:
+                            yield f"data: Progress: {total_deleted} emails deleted...\n\n"
+                        
+                        await asyncio.sleep(0.2)
+                        
+                        if not next_page_token and not from_cache:
+                            break
+                except Exception as e:
+                    yield f"data: Error processing '{query}': {str(e)}\n\n"
+                    continue
+        finally:
+            if archive:
+                archive.close()
+        
+        # Record for undo; emails restored with undo also train the personal spam model
+        if deleted_ids:
+            add_cleanup_history(session_id, deleted_ids, total_deleted)
         
         # Safety restore: restore read emails from trash
         if session.get("restore_enabled"):
             try:
                 yield "data: ⏮️ Restoring read emails from Trash...\n\n"
-                restored_count = restore_read_from_trash(service)
+                restored_count = restore_read_from_trash(service, cache_key=session_id)
                 yield f"data: ✓ Restored {restored_count} read emails\n\n"
             except Exception as e:
                 yield f"data: Warning during restore: {str(e)}\n\n"
@@ -130,4 +190,5 @@ async def progress(request: Request):
             else:
                 yield f"data: ✅ DONE. Total deleted: {total_deleted} emails total\n\n"
     
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    stream = profile_stream(event_stream(), "progress", enabled=should_profile(request))
+    return StreamingResponse(stream, media_type="text/event-stream")
@@ -0,0 +1,99 @@
+"""
+Top-senders report - "who is filling my inbox", and one-click trash by sender.
+"""
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from services.ai_rules import calculate_sender_stats
+from services.gmail_service import build_session_service, iter_query_metadata, list_messages, move_to_trash
+from services.profiling import should_profile, profile
+from services.queries import BASE_FILTER, check_cleanup_query
+from sessions.manager import get_session, add_cleanup_history
+
+router = APIRouter()
+
+# Largest top_k, and most messages one report scans (one metadata GET each)
+MAX_TOP_K = 200
+MAX_SCAN = 20_000
+
+
+@router.post("/api/top-senders")
+def top_senders(request: Request, data: dict):
+    """Stream From/size metadata for a query and report the heaviest senders."""
+    session_id = request.cookies.get("session_id")
+    if not get_session(session_id):
+        return JSONResponse({"error": "Session not found"}, status_code=401)
+
+    query = data.get("query", "")
+    try:
+        top_k = int(data.get("top_k", 20))
+        max_messages = int(data.get("max_messages") or MAX_SCAN)
+    except (TypeError, ValueError):
+        return JSONResponse({"error": "top_k and max_messages must be integers"}, status_code=400)
+    if not 1 <= top_k <= MAX_TOP_K or not 1 <= max_messages <= MAX_SCAN:
+        return JSONResponse(
+            {"error": f"top_k must be 1-{MAX_TOP_K} and max_messages 1-{MAX_SCAN}"}, status_code=400
+        )
+
+    try:
+        with profile("top-senders", enabled=should_profile(request)):
+            service = build_session_service(session_id)
+            messages = iter_query_metadata(
+                service,
+                query,
+                headers=['From'],
+                max_messages=max_messages,
+                cache_key=session_id
+            )
+            stats = calculate_sender_stats(messages, top_k=top_k)
+        stats["query"] = query
+        return JSONResponse(stats)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@router.post("/api/trash-sender")
+def trash_sender(request: Request, data: dict):
+    """
+    Move every unread message from one sender to trash with a single targeted
+    query. The run is recorded for /api/undo-session.
+    """
+    session_id = request.cookies.get("session_id")
+    if not get_session(session_id):
+        return JSONResponse({"error": "Session not found"}, status_code=401)
+
+    sender = data.get("sender", "").strip()
+    if not sender or any(c in sender for c in ' "(){}'):
+        return JSONResponse({"error": "Invalid sender"}, status_code=400)
+
+    query = f"{BASE_FILTER} from:{sender}"
+    if data.get("query"):
+        query += f" {data['query']}"
+    try:
+        check_cleanup_query(query)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    try:
+        service = build_session_service(session_id)
+        trashed_ids = []
+        trashed = set()
+        try:
+            while True:
+                # Trashed messages drop out of the query, so always re-list the first page
+                messages, next_page_token = list_messages(service, query, cache_key=session_id)
+                ids = [m['id'] for m in messages if m['id'] not in trashed]
+                if not ids:
+                    break  # nothing left, or the query still matches what we trashed
+                move_to_trash(service, ids, cache_key=session_id)
+                trashed.update(ids)
+                trashed_ids.extend(ids)
+                if not next_page_token:
+                    break
+        finally:
+            # Record whatever was trashed, even if a later page failed
+            if trashed_ids:
+                add_cleanup_history(session_id, trashed_ids, len(trashed_ids))
+
+        return JSONResponse({"success": True, "query": query, "emails_deleted": len(trashed_ids)})
+    except Exception as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=500)
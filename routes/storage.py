@@ -0,0 +1,72 @@
+"""
+Storage reclaim - trash the largest matching messages until a target is freed.
+
+This is the one cleanup path that may trash read mail (large attachments
+are usually read), so it is explicit: target_mb is required, dry_run is the
+default, and every run is recorded for /api/undo-session.
+"""
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from services.ai_rules import select_largest_messages, plan_storage_reclaim
+from services.gmail_service import build_session_service, iter_query_metadata, move_to_trash
+from services.profiling import should_profile, profile
+from sessions.manager import get_session, add_cleanup_history
+
+router = APIRouter()
+
+# Gmail accepts up to 1000 ids per batchModify; match list_messages page size
+TRASH_CHUNK = 500
+
+
+@router.post("/api/reclaim-storage")
+def reclaim_storage(request: Request, data: dict):
+    """
+    Free `target_mb` of storage by trashing the largest messages matching
+    `query` first. Only reports what would be trashed unless `dry_run` is
+    explicitly false.
+    """
+    session_id = request.cookies.get("session_id")
+    if not get_session(session_id):
+        return JSONResponse({"error": "Session not found"}, status_code=401)
+
+    query = data.get("query") or "larger:1M"
+    if data.get("target_mb") is None:
+        return JSONResponse({"error": "target_mb is required"}, status_code=400)
+    try:
+        target_bytes = int(float(data["target_mb"]) * 1024 * 1024)
+        max_candidates = int(data.get("max_candidates", 5000))
+    except (TypeError, ValueError):
+        return JSONResponse({"error": "target_mb and max_candidates must be numbers"}, status_code=400)
+    if target_bytes <= 0 or max_candidates <= 0:
+        return JSONResponse({"error": "target_mb and max_candidates must be positive"}, status_code=400)
+    dry_run = data.get("dry_run", True) is not False
+
+    try:
+        with profile("reclaim-storage", enabled=should_profile(request)):
+            service = build_session_service(session_id)
+            sizes = iter_query_metadata(service, query, msg_format='minimal', cache_key=session_id)
+            largest = select_largest_messages(sizes, max_candidates)
+            ids, planned_bytes = plan_storage_reclaim(largest, target_bytes)
+
+            if not dry_run:
+                trashed = []
+                try:
+                    for start in range(0, len(ids), TRASH_CHUNK):
+                        chunk = ids[start:start + TRASH_CHUNK]
+                        move_to_trash(service, chunk, cache_key=session_id)
+                        trashed.extend(chunk)
+                finally:
+                    if trashed:
+                        add_cleanup_history(session_id, trashed, len(trashed))
+
+        return JSONResponse({
+            "success": True,
+            "query": query,
+            "dry_run": dry_run,
+            "emails_selected": len(ids),
+            "freed_mb": round(planned_bytes / (1024 * 1024), 2),
+            "target_mb": round(target_bytes / (1024 * 1024), 2),
+            "target_reached": planned_bytes >= target_bytes
+        })
+    except Exception as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=500)
@@ -1,6 +1,11 @@
 import re
 import math
+import heapq
+import threading
 from collections import defaultdict
+from email.utils import parseaddr
+from services.profiling import timed
+from services.sketches import SpaceSaving
 
 # Bayesian Spam Classifier - Industry Standard Approach
 class BayesianSpamDetector:
@@ -108,6 +113,7 @@ class BayesianSpamDetector:
         
         return probability
     
+    @timed("classifier.calculate_spam_score")
     def calculate_spam_score(self, subject, sender, body=""):
         """
         Calculate spam probability using Bayesian theorem.
@@ -159,6 +165,67 @@ class BayesianSpamDetector:
         
         return is_spam, probability_spam, explanation
     
+    @timed("classifier.calculate_spam_scores")
+    def calculate_spam_scores(self, emails):
+        """
+        Score many (subject, sender, body) tuples at once.
+        Returns the same results as calculate_spam_score for each email, but
+        word totals and per-word probabilities are computed once per batch.
+        """
+        spam_total = sum(self.spam_words.values())
+        ham_total = sum(self.ham_words.values())
+        vocabulary = len(self.spam_words) + len(self.ham_words)
+        prior_spam = math.log(self.total_spam_mails / (self.total_spam_mails + self.total_ham_mails))
+        prior_ham = math.log(self.total_ham_mails / (self.total_spam_mails + self.total_ham_mails))
+        
+        log_probabilities = {}
+        results = []
+        for subject, sender, body in emails:
+            words = self._tokenize(f"{subject} {sender} {body}")
+            
+            if not words:
+                results.append((False, 0.0, "No text to analyze"))
+                continue
+            
+            spam_score = prior_spam
+            ham_score = prior_ham
+            detected_spam_words = []
+            for word in set(words):
+                logs = log_probabilities.get(word)
+                if logs is None:
+                    logs = log_probabilities[word] = (
+                        math.log((self.spam_words.get(word, 0) + 1) / (spam_total + vocabulary)),
+                        math.log((self.ham_words.get(word, 0) + 1) / (ham_total + vocabulary))
+                    )
+                spam_score += logs[0]
+                ham_score += logs[1]
+                
+                if self.spam_words.get(word, 0) > 5:
+                    detected_spam_words.append(word)
+            
+            try:
+                probability_spam = 1 / (1 + math.exp(ham_score - spam_score))
+            except OverflowError:
+                probability_spam = 0.5
+            
+            if detected_spam_words:
+                explanation = f"Detected spam indicators: {', '.join(detected_spam_words[:3])}"
+            else:
+                explanation = "Bayesian analysis based on email patterns"
+            
+            results.append((probability_spam > 0.5, probability_spam, explanation))
+        
+        return results
+    
+    def copy(self):
+        """Return an independent copy of the model (word counts included)."""
+        clone = BayesianSpamDetector.__new__(BayesianSpamDetector)
+        clone.spam_words = defaultdict(int, self.spam_words)
+        clone.ham_words = defaultdict(int, self.ham_words)
+        clone.total_spam_mails = self.total_spam_mails
+        clone.total_ham_mails = self.total_ham_mails
+        return clone
+    
     def train_on_email(self, subject, sender, body, is_spam):
         """
         Update classifier with new email (for continuous learning).
@@ -177,11 +244,31 @@ class BayesianSpamDetector:
                 self.ham_words[word] += 1
 
 
-# Global detector instance
-_detector = BayesianSpamDetector()
+# Global detector instance, built on first use to keep imports cheap
+_detector = None
+_detector_lock = threading.Lock()
 
 
-def detect_spam_bayesian(subject, sender, body=""):
+def get_detector(user=None) -> BayesianSpamDetector:
+    """
+    Return the shared detector, building it on first call. With a user, return
+    their personal model (see services/learning.py) if they have one.
+    """
+    global _detector
+    if user is not None:
+        from services.learning import personal_detector
+
+        personal = personal_detector(user)
+        if personal is not None:
+            return personal
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = BayesianSpamDetector()
+    return _detector
+
+
+def detect_spam_bayesian(subject, sender, body="", user=None):
     """
     Detect spam using Bayesian classification.
     Returns: (is_spam, confidence_score, explanation)
@@ -189,7 +276,7 @@ def detect_spam_bayesian(subject, sender, body=""):
     Industry-standard approach used by Gmail, Outlook, Thunderbird.
     Completely local - no external services.
     """
-    is_spam, confidence, explanation = _detector.calculate_spam_score(subject, sender, body)
+    is_spam, confidence, explanation = get_detector(user).calculate_spam_score(subject, sender, body)
     
     return is_spam, confidence, explanation
 
@@ -231,3 +318,75 @@ def calculate_email_stats(emails_data):
         stats["estimated_storage_mb"] += 0.05
     
     return stats
+
+
+def calculate_sender_stats(messages, top_k=20, capacity=None):
+    """
+    Approximate top senders by message count and by bytes from a stream of
+    {"size", "headers"} dicts (see gmail_service.iter_query_metadata).
+
+    Memory is fixed by `capacity` (default 10 * top_k) regardless of how many
+    messages are streamed. Counts are upper bounds; `error` is the maximum
+    overestimate for each sender.
+    """
+    capacity = capacity or top_k * 10
+    by_count = SpaceSaving(capacity)
+    by_bytes = SpaceSaving(capacity)
+
+    for message in messages:
+        sender = parseaddr(message["headers"].get("From", ""))[1].lower() or "unknown"
+        by_count.add(sender)
+        by_bytes.add(sender, message.get("size", 0))
+
+    def report(summary):
+        return [
+            {
+                "sender": sender,
+                "estimate": estimate,
+                "error": error,
+                "trash_query": f"from:{sender}" if sender != "unknown" else None
+            }
+            for sender, estimate, error in summary.top(top_k)
+        ]
+
+    return {
+        "total": by_count.total,
+        "total_bytes": by_bytes.total,
+        "estimated_storage_mb": round(by_bytes.total / (1024 * 1024), 2),
+        "by_count": report(by_count),
+        "by_bytes": report(by_bytes)
+    }
+
+
+def select_largest_messages(messages, k):
+    """
+    Keep the k largest messages from a stream of {"id", "size"} dicts in a
+    size-k min-heap. Returns them largest first.
+    """
+    if k <= 0:
+        return []
+
+    heap = []
+    for message in messages:
+        entry = (message.get("size", 0), message["id"])
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    return [{"id": msg_id, "size": size} for size, msg_id in sorted(heap, reverse=True)]
+
+
+def plan_storage_reclaim(largest, target_bytes):
+    """
+    Pick messages largest-first until target_bytes would be freed.
+    Returns (ids, planned_bytes); planned_bytes may fall short of the target.
+    """
+    ids = []
+    planned = 0
+    for message in largest:
+        if planned >= target_bytes:
+            break
+        ids.append(message["id"])
+        planned += message["size"]
+    return ids, planned
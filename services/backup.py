@@ -0,0 +1,266 @@
+"""
+Local backup - streams raw messages into a compressed, append-only archive
+before they are trashed, so they outlive Trash's 30 days.
+
+Archives are kept per account (so they outlive the session that wrote them),
+one directory per cleanup run: BACKUP_DIR/<account>/<run>/
+
+    chunk-00000.mbox.gz   mboxrd records, each its own gzip member
+    chunk-00001.mbox.gz   (a new chunk starts every `chunk_bytes`)
+    index.jsonl           {"id", "chunk", "offset", "length", "labels"} per message
+    restored.jsonl        {"id"} per message already re-imported
+
+Concatenated gzip members are a valid gzip stream, so each chunk is also an
+ordinary mbox.gz (`zcat chunk-*.mbox.gz`). The index lets single messages be
+read back with one seek, and both writing and restoring use constant memory.
+"""
+import base64
+import gzip
+import json
+import os
+import re
+import time
+from config import BACKUP_DIR
+from services.profiling import timed
+
+_FROM_LINE = re.compile(rb"^(>*From )", re.MULTILINE)
+_QUOTED_FROM_LINE = re.compile(rb"^>(>*From )", re.MULTILINE)
+_UNSAFE_PATH_CHARS = re.compile(r"[^A-Za-z0-9@._+-]")
+_RUN_NAME = re.compile(r"^\d{8}T\d{6}Z(-\d+)?$")
+
+# Labels restored from the index; user labels may have been deleted since
+_RESTORABLE_LABELS = re.compile(r"^(INBOX|UNREAD|STARRED|IMPORTANT|CATEGORY_\w+)$")
+
+# For entries archived without labels: cleanup only ever trashes unread mail
+DEFAULT_RESTORE_LABELS = ['INBOX', 'UNREAD']
+
+
+class MessageArchive:
+    """Append-only chunked mbox.gz archive with an offset index."""
+
+    def __init__(self, directory: str, chunk_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.chunk_bytes = chunk_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self.restored_path = os.path.join(directory, "restored.jsonl")
+
+        chunks = sorted(name for name in os.listdir(directory) if name.startswith("chunk-"))
+        self._chunk = int(chunks[-1][6:11]) if chunks else 0
+        self._chunk_file = None
+        self._index_file = None
+
+    def _chunk_path(self, chunk: int) -> str:
+        return os.path.join(self.directory, f"chunk-{chunk:05d}.mbox.gz")
+
+    def append(self, msg_id: str, raw: bytes, labels: list = None) -> None:
+        """Compress one raw RFC 822 message onto the archive, with its label IDs."""
+        if self._chunk_file is None:
+            self._chunk_file = open(self._chunk_path(self._chunk), "ab")
+            self._index_file = open(self.index_path, "a")
+        elif self._chunk_file.tell() >= self.chunk_bytes:
+            self._chunk_file.close()
+            self._chunk += 1
+            self._chunk_file = open(self._chunk_path(self._chunk), "ab")
+
+        envelope = f"From {msg_id}@gmail-cleaner {time.asctime(time.gmtime())}\n".encode()
+        body = _FROM_LINE.sub(rb">\1", raw.replace(b"\r\n", b"\n"))
+        if not body.endswith(b"\n"):
+            body += b"\n"
+        member = gzip.compress(envelope + body + b"\n")
+
+        offset = self._chunk_file.tell()
+        self._chunk_file.write(member)
+        self._chunk_file.flush()
+        self._index_file.write(json.dumps({
+            "id": msg_id,
+            "chunk": self._chunk,
+            "offset": offset,
+            "length": len(member),
+            "labels": labels or []
+        }) + "\n")
+        self._index_file.flush()
+
+    def close(self) -> None:
+        for f in (self._chunk_file, self._index_file):
+            if f:
+                f.close()
+        self._chunk_file = self._index_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def iter_index(self):
+        """Stream index entries in archive order."""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def read(self, entry: dict) -> bytes:
+        """Read back one message's raw bytes from its index entry."""
+        with open(self._chunk_path(entry["chunk"]), "rb") as f:
+            f.seek(entry["offset"])
+            record = gzip.decompress(f.read(entry["length"]))
+
+        body = record.split(b"\n", 1)[1][:-1]  # drop envelope line and separator
+        return _QUOTED_FROM_LINE.sub(rb"\1", body)
+
+    def iter_messages(self, ids: set = None):
+        """Yield (id, raw) for archived messages, optionally only those in ids."""
+        for entry in self.iter_index():
+            if ids is None or entry["id"] in ids:
+                yield entry["id"], self.read(entry)
+
+    def restored_ids(self) -> set:
+        """IDs of messages already re-imported from this archive."""
+        if not os.path.exists(self.restored_path):
+            return set()
+        with open(self.restored_path) as f:
+            return {json.loads(line)["id"] for line in f if line.strip()}
+
+    def mark_restored(self, msg_id: str) -> None:
+        with open(self.restored_path, "a") as f:
+            f.write(json.dumps({"id": msg_id}) + "\n")
+
+
+def account_backup_dir(account: str) -> str:
+    """Directory holding every backup run for an account."""
+    return os.path.join(BACKUP_DIR, _UNSAFE_PATH_CHARS.sub("_", account.lower()))
+
+
+def list_runs(account: str) -> list:
+    """An account's backup run names (runs that archived anything), oldest first."""
+    directory = account_backup_dir(account)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name for name in os.listdir(directory)
+        if _RUN_NAME.match(name) and os.path.exists(os.path.join(directory, name, "index.jsonl"))
+    )
+
+
+def new_run_archive(account: str) -> MessageArchive:
+    """Start a new, empty archive for one cleanup run."""
+    run = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    directory = os.path.join(account_backup_dir(account), run)
+    suffix = 1
+    while os.path.exists(directory):
+        directory = os.path.join(account_backup_dir(account), f"{run}-{suffix}")
+        suffix += 1
+    return MessageArchive(directory)
+
+
+def open_run(account: str, run: str = None):
+    """Open an existing run's archive (the latest if run is None), or None."""
+    runs = list_runs(account)
+    if run is None:
+        run = runs[-1] if runs else None
+    if run not in runs:
+        return None
+    return MessageArchive(os.path.join(account_backup_dir(account), run))
+
+
+@timed("backup.backup_messages")
+def backup_messages(service, ids: list, archive: MessageArchive, concurrency: int = 10) -> set:
+    """
+    Fetch format=raw messages and append them to the archive as they arrive.
+
+    At most `concurrency` messages are in flight (one batched HTTP request),
+    so memory stays bounded by the largest batch. Returns the ids that were
+    archived; callers should only trash those.
+    """
+    archived = set()
+
+    def store(request_id, response, exception):
+        if exception is not None:
+            print(f"Failed to back up email {request_id}: {exception}")
+            return
+        archive.append(request_id, base64.urlsafe_b64decode(response['raw']), response.get('labelIds'))
+        archived.add(request_id)
+
+    for start in range(0, len(ids), concurrency):
+        batch = service.new_batch_http_request(callback=store)
+        for msg_id in ids[start:start + concurrency]:
+            batch.add(service.users().messages().get(userId='me', id=msg_id, format='raw'), request_id=msg_id)
+        batch.execute()
+
+    return archived
+
+
+def restore_labels(entry: dict) -> list:
+    """Labels to import an archived message with: its original system labels."""
+    labels = [label for label in entry.get("labels") or [] if _RESTORABLE_LABELS.match(label)]
+    return labels or DEFAULT_RESTORE_LABELS
+
+
+def _missing_ids(service, ids: list) -> set:
+    """IDs that no longer exist in the mailbox (404), checked in one batch."""
+    missing = set()
+
+    def check(request_id, response, exception):
+        if exception is not None and getattr(getattr(exception, "resp", None), "status", None) == 404:
+            missing.add(request_id)
+
+    batch = service.new_batch_http_request(callback=check)
+    for msg_id in ids:
+        batch.add(service.users().messages().get(userId='me', id=msg_id, format='minimal'), request_id=msg_id)
+    batch.execute()
+    return missing
+
+
+@timed("backup.restore_from_archive")
+def restore_from_archive(service, archive: MessageArchive, ids: set = None, batch_size: int = 50) -> tuple:
+    """
+    Import archived messages back into the mailbox. Returns (restored, skipped).
+
+    Messages that still exist (in Trash, or restored by undo) and messages
+    this archive already re-imported are skipped, so restoring twice does not
+    create duplicates. Use undo, not this, for messages still in Trash.
+    """
+    done = archive.restored_ids()
+    restored = skipped = 0
+
+    def restore_batch(entries):
+        nonlocal restored, skipped
+        gone = _missing_ids(service, [entry["id"] for entry in entries])
+        for entry in entries:
+            msg_id = entry["id"]
+            if msg_id not in gone or msg_id in done:
+                skipped += 1
+                continue
+            try:
+                service.users().messages().import_(
+                    userId='me',
+                    internalDateSource='dateHeader',
+                    body={
+                        'raw': base64.urlsafe_b64encode(archive.read(entry)).decode(),
+                        'labelIds': restore_labels(entry)
+                    }
+                ).execute()
+                archive.mark_restored(msg_id)
+                done.add(msg_id)
+                restored += 1
+            except Exception as e:
+                print(f"Failed to restore email {msg_id}: {e}")
+
+    pending = []
+    for entry in archive.iter_index():
+        if ids is not None and entry["id"] not in ids:
+            continue
+        if entry["id"] in done:
+            skipped += 1
+            continue
+        pending.append(entry)
+        if len(pending) >= batch_size:
+            restore_batch(pending)
+            pending = []
+    if pending:
+        restore_batch(pending)
+
+    return restored, skipped
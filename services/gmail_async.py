@@ -0,0 +1,163 @@
+"""
+Async Gmail service module - the gmail_service functions over pooled HTTP/2.
+
+googleapiclient runs on httplib2: synchronous, one connection per service
+object and no multiplexing. This module talks to the Gmail REST API through
+a single httpx.AsyncClient with HTTP/2 enabled, shared by every session, so
+concurrent requests for an account multiplex over a few connections.
+
+Functions mirror services/gmail_service.py but take a google-auth
+Credentials object instead of a service. Requires `httpx[http2]`. Used by
+the /progress stream (listing and trashing) and by `cli.py --http2`.
+"""
+import asyncio
+import weakref
+from services import query_cache
+from services.profiling import timed
+
+GMAIL_API = "https://gmail.googleapis.com/gmail/v1/users/me"
+
+_client = None
+_refresh_locks = weakref.WeakKeyDictionary()  # creds -> asyncio.Lock
+
+
+def get_client():
+    """Return the process-wide pooled HTTP/2 client, creating it on first use."""
+    global _client
+    if _client is None:
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("The async Gmail client requires httpx: pip install 'httpx[http2]'") from e
+
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20)
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared client (call on application shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _auth_headers(creds) -> dict:
+    if not creds.valid:
+        # Single-flight per credential; other accounts refresh in parallel
+        lock = _refresh_locks.get(creds)
+        if lock is None:
+            lock = _refresh_locks[creds] = asyncio.Lock()
+        async with lock:
+            if not creds.valid:  # single-flight: a concurrent caller may have refreshed
+                from google.auth.transport.requests import Request
+
+                # google-auth refreshes synchronously; keep it off the event loop
+                await asyncio.to_thread(creds.refresh, Request())
+    return {"Authorization": f"Bearer {creds.token}"}
+
+
+async def _request(creds, method: str, path: str, **kwargs) -> dict:
+    response = await get_client().request(
+        method,
+        GMAIL_API + path,
+        headers=await _auth_headers(creds),
+        **kwargs
+    )
+    response.raise_for_status()
+    return response.json() if response.content else {}
+
+
+@timed("gmail_async.list_messages")
+async def list_messages(creds, query: str, max_results: int = 500, page_token: str = None) -> tuple:
+    """List messages matching query. Returns (messages, next_page_token)."""
+    params = {"q": query, "maxResults": max_results}
+    if page_token:
+        params["pageToken"] = page_token
+
+    results = await _request(creds, "GET", "/messages", params=params)
+    return results.get('messages', []), results.get('nextPageToken')
+
+
+@timed("gmail_async.move_to_trash")
+async def move_to_trash(creds, ids: list, cache_key: str = None) -> None:
+    """Move messages to trash."""
+    if not ids:
+        return
+
+    await _request(creds, "POST", "/messages/batchModify", json={'ids': ids, 'addLabelIds': ['TRASH']})
+
+    if cache_key:
+        query_cache.invalidate(cache_key, ids)
+
+
+@timed("gmail_async.restore_from_trash")
+async def restore_from_trash(creds, ids: list, cache_key: str = None) -> None:
+    """Restore messages from trash to inbox."""
+    if not ids:
+        return
+
+    await _request(creds, "POST", "/messages/batchModify", json={
+        'ids': ids,
+        'removeLabelIds': ['TRASH'],
+        'addLabelIds': ['INBOX']
+    })
+
+    if cache_key:
+        query_cache.invalidate(cache_key, ids)
+
+
+@timed("gmail_async.get_messages_metadata")
+async def get_messages_metadata(creds, ids: list, headers: list = None, msg_format: str = 'metadata',
+                                concurrency: int = 20) -> list:
+    """
+    Fetch messages concurrently (multiplexed over the shared connections).
+
+    Returns [{"id", "size", "headers"}] in input order; messages that fail
+    to fetch are skipped.
+    """
+    limit = asyncio.Semaphore(concurrency)
+    params = [("format", msg_format)] + [("metadataHeaders", h) for h in headers or []]
+
+    async def fetch(msg_id):
+        async with limit:
+            try:
+                return await _request(creds, "GET", f"/messages/{msg_id}", params=params)
+            except Exception as e:
+                print(f"Failed to fetch email {msg_id}: {e}")
+                return None
+
+    messages = []
+    for msg_id, data in zip(ids, await asyncio.gather(*(fetch(i) for i in ids))):
+        if data is None:
+            continue
+        messages.append({
+            "id": msg_id,
+            "size": data.get('sizeEstimate', 0),
+            "headers": {h['name']: h['value'] for h in data.get('payload', {}).get('headers', [])}
+        })
+    return messages
+
+
+async def restore_read_from_trash(creds) -> int:
+    """Restore all read emails from trash. Returns count of restored emails."""
+    total_restored = 0
+
+    while True:
+        # Restored messages leave the query, so always re-list the first page
+        messages, next_page_token = await list_messages(creds, query="in:trash -is:unread")
+        if not messages:
+            break
+
+        ids = [m['id'] for m in messages]
+        await restore_from_trash(creds, ids)
+        total_restored += len(ids)
+
+        if not next_page_token:
+            break
+
+    return total_restored
@@ -1,11 +1,18 @@
 """
 Gmail service module - all Gmail API interactions.
+
+The Google client libraries are imported inside build_service so importing
+this module does not pay for them on cold start.
+
+Functions that take a `cache_key` (the account, e.g. a session ID) read and
+fill services/query_cache.py; trash and restore invalidate it.
 """
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
 import json
+from services import query_cache
+from services.profiling import timed
 
 
+@timed("gmail.get_preview")
 def get_preview(service, query: str) -> list:
     """Get preview of emails matching the query."""
     results = service.users().messages().list(
@@ -33,7 +40,8 @@ def get_preview(service, query: str) -> list:
     return previews
 
 
-def move_to_trash(service, ids: list) -> None:
+@timed("gmail.move_to_trash")
+def move_to_trash(service, ids: list, cache_key: str = None) -> None:
     """Move messages to trash."""
     if not ids:
         return
@@ -42,9 +50,13 @@ def move_to_trash(service, ids: list) -> None:
         userId='me',
         body={'ids': ids, 'addLabelIds': ['TRASH']}
     ).execute()
+    
+    if cache_key:
+        query_cache.invalidate(cache_key, ids)
 
 
-def restore_from_trash(service, ids: list) -> None:
+@timed("gmail.restore_from_trash")
+def restore_from_trash(service, ids: list, cache_key: str = None) -> None:
     """Restore messages from trash to inbox."""
     if not ids:
         return
@@ -57,10 +69,20 @@ def restore_from_trash(service, ids: list) -> None:
             'addLabelIds': ['INBOX']
         }
     ).execute()
+    
+    if cache_key:
+        query_cache.invalidate(cache_key, ids)
 
 
-def list_messages(service, query: str, max_results: int = 500, page_token: str = None) -> tuple:
+@timed("gmail.list_messages")
+def list_messages(service, query: str, max_results: int = 500, page_token: str = None,
+                  cache_key: str = None) -> tuple:
     """List messages matching query. Returns (messages, next_page_token)."""
+    if cache_key:
+        cached = query_cache.get_listing(cache_key, query, page_token, max_results)
+        if cached is not None:
+            return cached
+    
     results = service.users().messages().list(
         userId='me',
         q=query,
@@ -71,10 +93,113 @@ def list_messages(service, query: str, max_results: int = 500, page_token: str =
     messages = results.get('messages', [])
     next_token = results.get('nextPageToken')
     
+    if cache_key:
+        query_cache.put_listing(cache_key, query, page_token, max_results, messages, next_token)
+        if page_token is None:
+            query_cache.put_count(cache_key, query, results.get('resultSizeEstimate', 0))
+    
     return messages, next_token
 
 
-def restore_read_from_trash(service) -> int:
+@timed("gmail.count_messages")
+def count_messages(service, query: str, cache_key: str = None) -> int:
+    """Gmail's estimate of how many messages match query."""
+    if cache_key:
+        cached = query_cache.get_count(cache_key, query)
+        if cached is not None:
+            return cached
+    
+    results = service.users().messages().list(userId='me', q=query, maxResults=1).execute()
+    count = results.get('resultSizeEstimate', 0)
+    
+    if cache_key:
+        query_cache.put_count(cache_key, query, count)
+    
+    return count
+
+
+@timed("gmail.get_messages_metadata")
+def get_messages_metadata(service, ids: list, headers: list = None, msg_format: str = 'metadata',
+                          batch_size: int = 50, cache_key: str = None) -> list:
+    """
+    Fetch messages in batched HTTP requests.
+
+    Returns [{"id", "size", "headers"}] in input order; messages that fail
+    to fetch are skipped. Use msg_format='minimal' when only sizes are needed.
+    """
+    cached = {}
+    if cache_key:
+        for msg_id in ids:
+            metadata = query_cache.get_metadata(cache_key, msg_id, msg_format, headers)
+            if metadata is not None:
+                cached[msg_id] = metadata
+    missing = [msg_id for msg_id in ids if msg_id not in cached]
+    
+    results = {}
+
+    def collect(request_id, response, exception):
+        if exception is None:
+            results[request_id] = response
+
+    for start in range(0, len(missing), batch_size):
+        batch = service.new_batch_http_request(callback=collect)
+        for msg_id in missing[start:start + batch_size]:
+            batch.add(
+                service.users().messages().get(
+                    userId='me',
+                    id=msg_id,
+                    format=msg_format,
+                    metadataHeaders=headers
+                ),
+                request_id=msg_id
+            )
+        batch.execute()
+
+    messages = []
+    for msg_id in ids:
+        if msg_id in cached:
+            messages.append(cached[msg_id])
+            continue
+        data = results.get(msg_id)
+        if data is None:
+            continue
+        metadata = {
+            "id": msg_id,
+            "size": data.get('sizeEstimate', 0),
+            "headers": {h['name']: h['value'] for h in data.get('payload', {}).get('headers', [])}
+        }
+        if cache_key:
+            query_cache.put_metadata(cache_key, msg_id, msg_format, headers, metadata)
+        messages.append(metadata)
+    return messages
+
+
+def iter_query_metadata(service, query: str, headers: list = None, msg_format: str = 'metadata',
+                        max_messages: int = None, cache_key: str = None):
+    """
+    Stream metadata for every message matching query, one listing page at a time.
+
+    Full scans can touch a whole mailbox, so only their listing pages are
+    cached; per-message metadata is not.
+    """
+    seen = 0
+    next_page_token = None
+
+    while True:
+        messages, next_page_token = list_messages(service, query, page_token=next_page_token, cache_key=cache_key)
+        ids = [m['id'] for m in messages]
+        if max_messages is not None:
+            ids = ids[:max_messages - seen]
+
+        yield from get_messages_metadata(service, ids, headers=headers, msg_format=msg_format)
+        seen += len(ids)
+
+        if not next_page_token or (max_messages is not None and seen >= max_messages):
+            break
+
+
+@timed("gmail.restore_read_from_trash")
+def restore_read_from_trash(service, cache_key: str = None) -> int:
     """Restore all read emails from trash. Returns count of restored emails."""
     total_restored = 0
     next_page_token = None
@@ -90,7 +215,7 @@ def restore_read_from_trash(service) -> int:
             break
         
         ids = [m['id'] for m in messages]
-        restore_from_trash(service, ids)
+        restore_from_trash(service, ids, cache_key=cache_key)
         total_restored += len(ids)
         
         if not next_page_token:
@@ -99,7 +224,48 @@ def restore_read_from_trash(service) -> int:
     return total_restored
 
 
+@timed("gmail.get_account_email")
+def get_account_email(service) -> str:
+    """Email address of the account the service is signed in as."""
+    return service.users().getProfile(userId='me').execute()['emailAddress']
+
+
+def get_session_account(session_id: str) -> str:
+    """The session's account email, looked up once and kept on the session."""
+    from sessions.manager import get_session, update_session
+
+    session = get_session(session_id)
+    if session is None:
+        raise ValueError("Session not found")
+    if not session.get("account"):
+        update_session(session_id, {"account": get_account_email(build_session_service(session_id))})
+    return session["account"]
+
+
+@timed("gmail.build_service")
 def build_service(credentials_json: str):
     """Build Gmail service from credentials JSON."""
+    from googleapiclient.discovery import build
+    from google.oauth2.credentials import Credentials
+
     creds = Credentials.from_authorized_user_info(json.loads(credentials_json))
     return build('gmail', 'v1', credentials=creds)
+
+
+@timed("gmail.build_service_from_credentials")
+def build_service_from_credentials(creds):
+    """Build Gmail service from a Credentials object."""
+    from googleapiclient.discovery import build
+
+    return build('gmail', 'v1', credentials=creds)
+
+
+@timed("gmail.build_session_service")
+def build_session_service(session_id: str):
+    """Build Gmail service from the session's shared, auto-refreshed credentials."""
+    from auth.credentials import get_credentials
+
+    creds = get_credentials(session_id)
+    if creds is None:
+        raise ValueError("Session has no credentials")
+    return build_service_from_credentials(creds)
@@ -0,0 +1,173 @@
+"""
+Online learning - per-user spam models trained from user corrections.
+
+Emails a user restores with undo, or unchecks in the preview, are ham
+signals. record_correction() only enqueues them; a background worker drains
+the queue in batches, trains a copy of the user's model (starting from the
+shared base model) and publishes it by swapping a dict entry. Scoring reads
+whatever model is currently published and never waits on training.
+
+A "user" is the Gmail account address (see gmail_service.get_session_account),
+so a model survives new sessions. The worker also appends every correction
+to LEARNING_DIR/<account>.jsonl. Only the MAX_MODELS most recently used
+models are kept in memory. An evicted model, or one lost on restart, is
+rebuilt in the background from that log the next time it is asked for.
+Until then the account is scored with the shared model.
+"""
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from config import LEARNING_DIR
+from services.ai_rules import get_detector
+
+# Corrections applied per training pass, and how long to gather a batch
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 5.0
+
+# Most emails looked up from a single undo or preview action
+MAX_CORRECTIONS_PER_ACTION = 500
+
+# Personal models kept in memory; the least recently used is dropped first
+MAX_MODELS = 100
+
+# Most recent saved corrections replayed when rebuilding a model
+MAX_REPLAYED_CORRECTIONS = 5000
+
+_UNSAFE_PATH_CHARS = re.compile(r"[^A-Za-z0-9@._+-]")
+
+_corrections = queue.SimpleQueue()
+_models = OrderedDict()  # user -> published BayesianSpamDetector, never mutated after publishing
+_models_lock = threading.Lock()
+_reloading = set()  # users whose model is queued for rebuilding from disk
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def personal_detector(user):
+    """
+    The user's published personal model, or None if there is none in memory.
+    A user with saved corrections gets their model rebuilt in the background.
+    """
+    with _models_lock:
+        model = _models.get(user)
+        if model is not None:
+            _models.move_to_end(user)
+            return model
+        if user is None or user in _reloading or not os.path.exists(_corrections_path(user)):
+            return None
+        _reloading.add(user)
+
+    _corrections.put((user, None, None, None))  # reload marker, no correction
+    _ensure_worker()
+    return None
+
+
+def _corrections_path(user) -> str:
+    return os.path.join(LEARNING_DIR, _UNSAFE_PATH_CHARS.sub("_", str(user).lower()) + ".jsonl")
+
+
+def _save_corrections(user, corrections: list) -> None:
+    os.makedirs(LEARNING_DIR, exist_ok=True)
+    with open(_corrections_path(user), "a") as f:
+        for subject, sender, is_spam in corrections:
+            f.write(json.dumps({"subject": subject, "sender": sender, "spam": is_spam}) + "\n")
+
+
+def _load_model(user):
+    """Rebuild a user's model from their saved corrections, or None if they have none."""
+    path = _corrections_path(user)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        saved = deque((json.loads(line) for line in f if line.strip()), maxlen=MAX_REPLAYED_CORRECTIONS)
+    model = get_detector().copy()
+    for correction in saved:
+        model.train_on_email(correction["subject"], correction["sender"], "", correction["spam"])
+    return model
+
+
+def record_correction(user, subject: str, sender: str, is_spam: bool) -> None:
+    """Queue one labeled email for the user's model. Never blocks on training."""
+    _corrections.put((user, subject, sender, is_spam))
+    _ensure_worker()
+
+
+def _ensure_worker() -> None:
+    global _worker
+    if _worker is not None:
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name="spam-model-trainer", daemon=True)
+            _worker.start()
+
+
+def _next_batch() -> list:
+    """Block for one correction, then gather more for up to FLUSH_INTERVAL."""
+    batch = [_corrections.get()]
+    deadline = time.monotonic() + FLUSH_INTERVAL
+    while len(batch) < BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_corrections.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def apply_corrections(batch: list) -> None:
+    """Train and publish new models for every user in the batch."""
+    by_user = {}
+    for user, subject, sender, is_spam in batch:
+        by_user.setdefault(user, []).append((subject, sender, is_spam))
+
+    for user, corrections in by_user.items():
+        corrections = [c for c in corrections if c[0] is not None]  # drop reload markers
+        with _models_lock:
+            published = _models.get(user)
+
+        if published is not None:
+            model = published.copy()
+        else:
+            # Saved corrections already include everything trained before eviction
+            model = _load_model(user) or get_detector().copy()
+
+        for subject, sender, is_spam in corrections:
+            model.train_on_email(subject, sender, "", is_spam)
+        if corrections:
+            _save_corrections(user, corrections)
+
+        with _models_lock:
+            _reloading.discard(user)
+            _models[user] = model  # publish; readers see old or new, never partial
+            _models.move_to_end(user)
+            while len(_models) > MAX_MODELS:
+                evicted, _ = _models.popitem(last=False)
+                print(f"Evicted personal spam model for {evicted}; it is rebuilt from saved corrections on next use")
+
+
+def _run() -> None:
+    while True:
+        batch = _next_batch()
+        try:
+            apply_corrections(batch)
+        except Exception as e:
+            print(f"Failed to apply {len(batch)} spam model corrections: {e}")
+
+
+def record_message_corrections(service, user, ids: list, is_spam: bool, cache_key: str = None) -> int:
+    """Look up Subject/From for message ids and queue them as corrections. Returns count."""
+    from services.gmail_service import get_messages_metadata
+
+    metadata = get_messages_metadata(service, ids[:MAX_CORRECTIONS_PER_ACTION], headers=['Subject', 'From'],
+                                     cache_key=cache_key)
+    for message in metadata:
+        headers = message["headers"]
+        record_correction(user, headers.get("Subject", ""), headers.get("From", ""), is_spam)
+    return len(metadata)
@@ -0,0 +1,178 @@
+"""
+Profiling hooks - opt-in sampling profiler for requests and background jobs.
+
+A profile samples the stack of the thread that started it and writes it as
+collapsed stacks ("outer;inner;leaf count"), which flamegraph.pl and
+speedscope read directly. Functions wrapped with @timed also record
+per-call-site wall time while a profile is active; otherwise they cost a
+single context variable lookup.
+"""
+import os
+import sys
+import inspect
+import time
+import random
+import secrets
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from config import PROFILE_ADMIN_TOKEN, PROFILE_SAMPLE_RATE, PROFILE_INTERVAL, PROFILE_DIR
+
+_active_profile: ContextVar = ContextVar("active_profile", default=None)
+
+
+class SamplingProfiler:
+    """Samples one thread's stack on a timer and aggregates collapsed stacks."""
+
+    def __init__(self, name: str, interval: float = PROFILE_INTERVAL, note: str = None):
+        self.name = name
+        self.note = note
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = defaultdict(int)
+        self.timings = defaultdict(lambda: [0, 0.0])  # call site -> [calls, seconds]
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.name}", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def record(self, site: str, elapsed: float) -> None:
+        """Add one timed call for a call site."""
+        timing = self.timings[site]
+        timing[0] += 1
+        timing[1] += elapsed
+
+    def write(self, directory: str = PROFILE_DIR) -> str:
+        """Write <name>.collapsed and <name>.timings.tsv; return the stack file path."""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{self.name}-{int(time.time())}-{secrets.token_hex(4)}")
+
+        with open(base + ".collapsed", "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+        with open(base + ".timings.tsv", "w") as f:
+            f.write(f"# {self.name}: {self.duration * 1000:.1f} ms wall\n")
+            if self.note:
+                f.write(f"# {self.note}\n")
+            f.write("site\tcalls\ttotal_ms\tavg_ms\n")
+            for site, (calls, seconds) in sorted(self.timings.items(), key=lambda t: -t[1][1]):
+                f.write(f"{site}\t{calls}\t{seconds * 1000:.2f}\t{seconds * 1000 / calls:.3f}\n")
+
+        return base + ".collapsed"
+
+
+def _collapse(frame) -> str:
+    """Render a frame chain root-first as a collapsed stack line."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names)).replace(" ", "_")
+
+
+def should_profile(request) -> bool:
+    """
+    Decide whether to profile a request.
+
+    Admins force it with an X-Profile-Token header (or profile_token query
+    parameter, for EventSource clients) matching PROFILE_ADMIN_TOKEN;
+    otherwise a PROFILE_SAMPLE_RATE fraction of traffic is profiled.
+    """
+    token = request.headers.get("X-Profile-Token") or request.query_params.get("profile_token")
+    if PROFILE_ADMIN_TOKEN and token and secrets.compare_digest(token, PROFILE_ADMIN_TOKEN):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def profile(name: str, enabled: bool = True, note: str = None):
+    """
+    Profile the enclosed block (a request handler or background job).
+
+    Nested profiles are ignored; the outermost one collects everything.
+    `note` is written to the timings file header.
+    """
+    if not enabled or _active_profile.get() is not None:
+        yield None
+        return
+
+    profiler = SamplingProfiler(name, note=note)
+    _active_profile.set(profiler)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _active_profile.set(None)
+        try:
+            path = profiler.write()
+            print(f"Profile written: {path}")
+        except OSError as e:
+            print(f"Failed to write profile {name}: {e}")
+
+
+def timed(site: str):
+    """Decorator recording wall time per call site into the active profile."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                profiler = _active_profile.get()
+                if profiler is None:
+                    return await func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    profiler.record(site, time.perf_counter() - start)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _active_profile.get()
+            if profiler is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.record(site, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+async def profile_stream(stream, name: str, enabled: bool = True):
+    """
+    Profile an async generator (e.g. a StreamingResponse body) until it finishes.
+
+    The generator runs on the event loop thread, so the sampled stacks also
+    include every other request the loop served meanwhile; the @timed call
+    sites are still this stream's own. Profile a quiet server, or move the
+    work into a thread and use profile() there, to see one request alone.
+    """
+    note = "stacks sampled from the shared event loop thread; they include concurrent requests"
+    with profile(name, enabled, note=note):
+        async for chunk in stream:
+            yield chunk
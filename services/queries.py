@@ -0,0 +1,68 @@
+"""
+Gmail query building - turns the cleanup filter options into search queries.
+"""
+import re
+
+# Safety filter: only unread emails are ever cleaned. The one exception is
+# routes/storage.py (reclaim by size), which is dry-run by default and undoable.
+BASE_FILTER = "is:unread"
+
+# Location operators that keep matching a message after it is trashed
+_LOCATION_OPERATOR = re.compile(r"(?:^|[\s({])-?(?:in:|label:(?:trash|spam)\b)", re.IGNORECASE)
+
+
+def check_cleanup_query(query: str) -> str:
+    """
+    Return query if it is safe to trash-and-relist; ValueError otherwise.
+
+    Cleanup loops re-list the first page after trashing it, which only ends
+    if trashed messages drop out of the query, so in:trash, in:anywhere and
+    friends are rejected.
+    """
+    if _LOCATION_OPERATOR.search(query):
+        raise ValueError(f"Cleanup queries cannot use in:/label:trash operators: {query!r}")
+    return query
+
+
+def build_queries(
+    unread: bool = False,
+    promotions: bool = False,
+    social: bool = False,
+    updates: bool = False,
+    age: str = ""
+) -> list:
+    """Build the de-duplicated list of Gmail queries for the selected filters."""
+    queries = []
+    
+    if unread:
+        queries.append(BASE_FILTER)
+    
+    if promotions:
+        queries.append(f"{BASE_FILTER} category:promotions")
+    
+    if social:
+        queries.append(f"{BASE_FILTER} category:social")
+    
+    if updates:
+        queries.append(f"{BASE_FILTER} category:updates")
+    
+    # Add age filter if selected
+    if age:
+        queries = [q + f" older_than:{age}" for q in queries]
+    
+    # Remove duplicates while preserving order
+    seen = set()
+    unique_queries = []
+    for q in queries:
+        if q not in seen:
+            seen.add(q)
+            unique_queries.append(q)
+    queries = unique_queries
+    
+    # If no specific filters selected, default to unread only
+    if not queries:
+        queries = [BASE_FILTER]
+        if age:
+            queries = [f"{BASE_FILTER} older_than:{age}"]
+    
+    return queries
@@ -0,0 +1,150 @@
+"""
+Query cache - per-account cache of listing pages, counts and message metadata.
+
+A session typically previews a query, asks for its stats and then cleans it,
+and each step used to list it from Gmail again. Entries live for a short TTL
+in one size-bounded LRU (sized by message ids held, not entry count) and are
+dropped for an account whenever our own batchModify calls change its labels.
+Each account also has its own weight budget, evicting its own oldest entries
+first, so one large mailbox cannot push every other account out.
+
+The "account" is the cache key the caller passes in; the web routes use the
+session ID.
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+# Seconds an entry stays valid
+TTL = 120.0
+
+# Total weight (roughly: message ids and metadata records) kept in memory
+MAX_WEIGHT = 200_000
+
+# Most weight a single account may hold
+MAX_ACCOUNT_WEIGHT = 20_000
+
+
+class QueryCache:
+    """Thread-safe LRU with TTL, weighted eviction and per-account invalidation."""
+
+    def __init__(self, max_weight: int = MAX_WEIGHT, ttl: float = TTL,
+                 max_account_weight: int = MAX_ACCOUNT_WEIGHT):
+        self.max_weight = max_weight
+        self.max_account_weight = max_account_weight
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, weight, value)
+        self._by_account = defaultdict(OrderedDict)  # account -> its keys, least recent first
+        self._account_weight = defaultdict(int)
+        self._weight = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self._by_account[key[1]].move_to_end(key)
+            return entry[2]
+
+    def put(self, key, value, weight: int = 1) -> None:
+        account = key[1]
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, weight, value)
+            self._by_account[account][key] = None
+            self._account_weight[account] += weight
+            self._weight += weight
+            while self._account_weight[account] > self.max_account_weight:
+                self._remove(next(iter(self._by_account[account])))
+            while self._weight > self.max_weight and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, account: str, ids=None) -> None:
+        """Drop an account's listings and counts, and metadata for ids."""
+        ids = set(ids or ())
+        with self._lock:
+            for key in list(self._by_account.get(account, ())):
+                if key[0] != "meta" or key[2] in ids:
+                    self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_account.clear()
+            self._account_weight.clear()
+            self._weight = 0
+
+    def _remove(self, key) -> None:
+        _, weight, _ = self._entries.pop(key)
+        self._weight -= weight
+        account = key[1]
+        self._account_weight[account] -= weight
+        keys = self._by_account[account]
+        del keys[key]
+        if not keys:
+            del self._by_account[account]
+            del self._account_weight[account]
+
+
+_cache = QueryCache()
+
+
+def get_listing(account: str, query: str, page_token: str, max_results: int):
+    """Cached (messages, next_page_token) for one listing page, or None."""
+    entry = _cache.get(("list", account, query, page_token))
+    if entry and entry[0] == max_results:
+        return entry[1], entry[2]
+    return None
+
+
+def put_listing(account: str, query: str, page_token: str, max_results: int, messages: list,
+                next_page_token: str) -> None:
+    _cache.put(("list", account, query, page_token), (max_results, messages, next_page_token),
+               weight=max(len(messages), 1))
+
+
+def listed_ids(account: str, query: str) -> list:
+    """
+    IDs already listed for a query, following cached pages from the first
+    one (whatever page size they were listed with). Empty if none cached.
+    """
+    ids = []
+    page_token = None
+    seen_tokens = set()
+    while True:
+        entry = _cache.get(("list", account, query, page_token))
+        if entry is None:
+            break
+        ids.extend(m['id'] for m in entry[1])
+        page_token = entry[2]
+        if not page_token or page_token in seen_tokens:
+            break
+        seen_tokens.add(page_token)
+    return ids
+
+
+def get_count(account: str, query: str):
+    return _cache.get(("count", account, query))
+
+
+def put_count(account: str, query: str, count: int) -> None:
+    _cache.put(("count", account, query), count)
+
+
+def get_metadata(account: str, msg_id: str, msg_format: str, headers):
+    return _cache.get(("meta", account, msg_id, msg_format, tuple(headers or ())))
+
+
+def put_metadata(account: str, msg_id: str, msg_format: str, headers, metadata: dict) -> None:
+    _cache.put(("meta", account, msg_id, msg_format, tuple(headers or ())), metadata)
+
+
+def invalidate(account: str, ids=None) -> None:
+    """Call after modifying an account's messages (trash, restore)."""
+    _cache.invalidate(account, ids)
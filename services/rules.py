@@ -0,0 +1,193 @@
+r"""
+Rule engine - user-defined cleanup rules compiled into Gmail queries plus
+local filters.
+
+A rule is a dict; every condition is optional and all of them must hold:
+
+    {
+        "sender_domains": ["news.example.com"],  # from:(@a OR @b)
+        "subject_regex": "weekly digest",        # case-insensitive regex search
+        "min_size_kb": 500,                      # larger:500k
+        "older_than_days": 30,                   # older_than:30d
+        "min_spam_score": 70                     # local only, 0-100
+    }
+
+Every rule keeps the is:unread safety filter (services/queries.BASE_FILTER).
+Rules are checked strictly, since a rule that narrowed nothing would trash
+every unread email: unknown keys, wrong types, out-of-range numbers and
+rules with no condition at all raise RuleError.
+
+Everything Gmail can evaluate goes into the query, so messages are only
+downloaded when a condition is left that it cannot (a real regex, or a spam
+score cutoff). Those remaining conditions run as a LocalFilter over a whole
+page of headers at once.
+
+Gmail matches subject: terms on whole words only, so a subject regex is
+pushed down only when it is plain words bounded by \b on both sides, e.g.
+r"\bweekly digest\b" or r"\b(sale|clearance)\b". Anything else, including
+a bare "sale" (which also matches "Wholesale"), is checked locally.
+"""
+import re
+from services.queries import BASE_FILTER
+
+# \b-bounded words/phrases (or an alternation of them) match as Gmail subject: terms
+_WORD_BOUNDED_LITERALS = re.compile(r"^\\b(?:([\w ]+)|\(([\w ]+(?:\|[\w ]+)*)\))\\b$")
+_DOMAIN = re.compile(r"^[A-Za-z0-9.-]+\.[A-Za-z]{2,}$")
+
+RULE_KEYS = {"sender_domains", "subject_regex", "min_size_kb", "older_than_days", "min_spam_score"}
+
+
+class RuleError(ValueError):
+    """Raised for rules that cannot be compiled."""
+
+
+class LocalFilter:
+    """Predicates Gmail cannot evaluate, applied column-wise to a page of messages."""
+
+    headers = ['Subject', 'From']
+
+    def __init__(self, subject_pattern=None, min_spam_score=None):
+        self.subject_pattern = subject_pattern
+        self.min_spam_score = min_spam_score
+
+    def apply(self, messages: list, user=None) -> list:
+        """
+        Return a keep/drop mask for [{"id", "headers"}] metadata records,
+        scoring spam with the user's personal model when they have one.
+        """
+        subjects = [m["headers"].get("Subject", "") for m in messages]
+        senders = [m["headers"].get("From", "") for m in messages]
+        mask = [True] * len(messages)
+
+        if self.subject_pattern is not None:
+            search = self.subject_pattern.search
+            mask = [keep and search(subject) is not None for keep, subject in zip(mask, subjects)]
+
+        if self.min_spam_score is not None:
+            from services.ai_rules import get_detector
+
+            # Only score rows that survived the cheaper predicates
+            rows = [i for i, keep in enumerate(mask) if keep]
+            scores = get_detector(user).calculate_spam_scores((subjects[i], senders[i], "") for i in rows)
+            for i, (_, confidence, _) in zip(rows, scores):
+                mask[i] = confidence * 100 >= self.min_spam_score
+
+        return mask
+
+
+class CompiledRule:
+    """A Gmail query plus the LocalFilter for whatever it cannot express (or None)."""
+
+    def __init__(self, query: str, local_filter: LocalFilter = None):
+        self.query = query
+        self.local_filter = local_filter
+
+
+def _positive_int(rule: dict, key: str):
+    value = rule.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise RuleError(f"{key} must be a positive integer, got {value!r}")
+    return value
+
+
+def _validate_rule(rule) -> None:
+    """Raise RuleError unless rule is a dict of known, well-typed conditions with at least one set."""
+    if not isinstance(rule, dict):
+        raise RuleError(f"Each rule must be an object, got {rule!r}")
+
+    unknown = set(rule) - RULE_KEYS
+    if unknown:
+        raise RuleError(f"Unknown rule keys: {', '.join(sorted(unknown))} (expected {', '.join(sorted(RULE_KEYS))})")
+
+    domains = rule.get("sender_domains")
+    if domains is not None:
+        if not isinstance(domains, list) or not all(isinstance(d, str) for d in domains):
+            raise RuleError("sender_domains must be a list of domains")
+        for domain in domains:
+            if not _DOMAIN.match(domain):
+                raise RuleError(f"Invalid sender domain: {domain!r}")
+
+    pattern = rule.get("subject_regex")
+    if pattern is not None and not isinstance(pattern, str):
+        raise RuleError("subject_regex must be a string")
+
+    _positive_int(rule, "min_size_kb")
+    _positive_int(rule, "older_than_days")
+
+    score = rule.get("min_spam_score")
+    if score is not None:
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 < score <= 100:
+            raise RuleError(f"min_spam_score must be greater than 0 and at most 100, got {score!r}")
+
+    if not any(rule.get(key) for key in RULE_KEYS):
+        raise RuleError("Rule has no conditions; it would match every unread email")
+
+
+def compile_rule(rule: dict) -> CompiledRule:
+    """Compile one rule dict into the narrowest Gmail query and a local filter."""
+    _validate_rule(rule)
+    terms = [BASE_FILTER]
+    subject_pattern = None
+    min_spam_score = None
+
+    domains = rule.get("sender_domains") or []
+    if domains:
+        terms.append("from:(" + " OR ".join(f"@{d.lower()}" for d in domains) + ")")
+
+    pattern = rule.get("subject_regex")
+    if pattern:
+        literals = _WORD_BOUNDED_LITERALS.match(pattern)
+        phrases = [p.strip() for p in (literals.group(1) or literals.group(2)).split("|")] if literals else []
+        if phrases and all(phrases):
+            terms.append("subject:(" + " OR ".join(f'"{p}"' for p in phrases) + ")")
+        else:
+            try:
+                subject_pattern = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                raise RuleError(f"Invalid subject regex {pattern!r}: {e}")
+
+    if rule.get("min_size_kb"):
+        terms.append(f"larger:{rule['min_size_kb']}k")
+
+    if rule.get("older_than_days"):
+        terms.append(f"older_than:{rule['older_than_days']}d")
+
+    if rule.get("min_spam_score") is not None:
+        min_spam_score = float(rule["min_spam_score"])
+
+    local_filter = None
+    if subject_pattern is not None or min_spam_score is not None:
+        local_filter = LocalFilter(subject_pattern, min_spam_score)
+
+    return CompiledRule(" ".join(terms), local_filter)
+
+
+def compile_rules(rules: list) -> list:
+    """Compile rules, merging those that end up with the same query and no local filter."""
+    if not isinstance(rules, list):
+        raise RuleError("Rules must be a list of rule objects")
+    compiled = []
+    seen = set()
+    for rule in rules:
+        result = compile_rule(rule)
+        if result.local_filter is None:
+            if result.query in seen:
+                continue
+            seen.add(result.query)
+        compiled.append(result)
+    return compiled
+
+
+def filter_messages(service, rule: CompiledRule, messages: list, cache_key: str = None, user=None) -> list:
+    """IDs from a listing page that pass the rule's local filter (all of them if none)."""
+    ids = [m['id'] for m in messages]
+    if rule.local_filter is None:
+        return ids
+
+    from services.gmail_service import get_messages_metadata
+
+    metadata = get_messages_metadata(service, ids, headers=LocalFilter.headers, cache_key=cache_key)
+    mask = rule.local_filter.apply(metadata, user=user)
+    return [m["id"] for m, keep in zip(metadata, mask) if keep]
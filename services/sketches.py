@@ -0,0 +1,60 @@
+"""
+Streaming summaries - fixed-memory approximations over large mailboxes.
+"""
+import heapq
+
+
+class SpaceSaving:
+    """
+    Approximate top-K heavy hitters in fixed memory (Space-Saving algorithm).
+
+    Tracks at most `capacity` keys. When a new key arrives and the summary is
+    full, it replaces the smallest counter and inherits its count, which is
+    recorded as that key's maximum overestimate ("error"). Any key whose true
+    weight exceeds total / capacity is guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        # Min-heap of (count, key); entries go stale as counts grow and are
+        # skipped lazily. Rebuilt once it outgrows the live counters.
+        self._heap = []
+
+    def add(self, key, weight: int = 1) -> None:
+        """Count one occurrence of key with the given (positive) weight."""
+        if weight <= 0:
+            return
+        self.total += weight
+
+        if key in self.counts:
+            self.counts[key] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = weight
+            self.errors[key] = 0
+        else:
+            min_key, min_count = self._pop_min()
+            del self.counts[min_key]
+            del self.errors[min_key]
+            self.counts[key] = min_count + weight
+            self.errors[key] = min_count
+
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, k) for k, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> tuple:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return key, count
+
+    def top(self, k: int) -> list:
+        """Return up to k (key, estimated_count, max_error) tuples, largest first."""
+        items = heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+        return [(key, count, self.errors[key]) for key, count in items]
@@ -12,7 +12,9 @@ def create_session(
     queries: list, 
     restore_enabled: bool,
     enable_spam_detection: bool = False,
-    enable_preview: bool = True
+    enable_preview: bool = True,
+    enable_backup: bool = False,
+    rules: list = None
 ) -> str:
     """Create a new session and return session ID."""
     session_id = secrets.token_hex(16)
@@ -21,6 +23,8 @@ def create_session(
         "restore_enabled": restore_enabled,
         "enable_spam_detection": enable_spam_detection,
         "enable_preview": enable_preview,
+        "enable_backup": enable_backup,
+        "rules": rules or [],
         "state": None,
         "creds": None,
         "cleanup_history": [],  # Track cleanup sessions for undo
@@ -56,8 +60,11 @@ def add_cleanup_history(session_id: str, email_ids: list, total_deleted: int) ->
 
 def delete_session(session_id: str) -> None:
     """Delete a session."""
+    from auth.credentials import forget_credentials
+
     if session_id in _sessions:
         del _sessions[session_id]
+    forget_credentials(session_id)
 
 
 def list_all_sessions() -> Dict[str, Dict[str, Any]]: